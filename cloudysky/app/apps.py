@@ -0,0 +1,17 @@
+from django.apps import AppConfig
+
+
+class AppConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'app'
+
+    def ready(self):
+        from django.core import checks
+        from django.db.models.signals import post_migrate
+
+        from . import search, signals  # noqa: F401
+        from .readiness import schema_check
+
+        # deploy-only, so `migrate` itself does not warn about what it is applying
+        checks.register(schema_check, checks.Tags.database, deploy=True)
+        post_migrate.connect(search.restore_triggers, sender=self)
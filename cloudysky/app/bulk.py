@@ -0,0 +1,149 @@
+"""
+NDJSON bulk ingestion of posts and comments.
+
+The request body is read one line at a time, each row is validated as it
+arrives, and valid rows are written with bulk_create in batches inside a
+single transaction. Only one batch of model instances is held at a time;
+the per-line results ({"line", "id"} or {"line", "error"}) are kept for
+the whole upload, since they make up the response.
+
+A post can be deleted after its batch's existence check but before the
+upload commits. The foreign key constraints are deferred to the commit,
+so the whole upload then fails with IntegrityError and nothing is kept.
+"""
+import json
+
+from django.conf import settings
+from django.db import transaction
+
+from . import counters, feed_cache
+from .models import Comment, Post
+
+MAX_BATCH_SIZE = 5000
+
+
+def parse_batch_size(value):
+    if value in (None, ""):
+        return getattr(settings, "BULK_BATCH_SIZE", 500)
+    size = int(value)
+    if size < 1:
+        raise ValueError("batch_size must be positive")
+    return min(size, MAX_BATCH_SIZE)
+
+
+def iter_rows(stream):
+    """Yield (line number, row dict or None, error or None) for each NDJSON line."""
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield number, None, "invalid JSON"
+            continue
+        if not isinstance(row, dict):
+            yield number, None, "expected a JSON object"
+            continue
+        yield number, row, None
+
+
+def text_field(row, name):
+    value = row.get(name)
+    return value.strip() if isinstance(value, str) else ""
+
+
+def ingest(stream, build, model, batch_size, check_batch=None, after_batch=None):
+    """
+    Validate rows from `stream` with `build(row) -> (obj, error)` and insert
+    the valid ones in batches. `check_batch(batch, results)` may drop rows
+    that need a database check, recording an error for each;
+    `after_batch(created)` runs in the same transaction after each insert.
+
+    Returns one {"line", "id"} or {"line", "error"} dict per row, in input order.
+    """
+    results = []
+    batch = []
+
+    def flush():
+        rows = check_batch(batch, results) if check_batch else batch
+        created = model.objects.bulk_create([obj for _, obj in rows])
+        if after_batch and created:
+            after_batch(created)
+        results.extend(
+            {"line": line, "id": obj.pk} for (line, _), obj in zip(rows, created)
+        )
+        batch.clear()
+
+    with transaction.atomic():
+        for line, row, error in iter_rows(stream):
+            if error is None:
+                obj, error = build(row)
+            if error:
+                results.append({"line": line, "error": error})
+                continue
+            batch.append((line, obj))
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+    results.sort(key=lambda result: result["line"])
+    return results
+
+
+def ingest_posts(stream, author, batch_size):
+    def build(row):
+        title = text_field(row, "title")
+        content = text_field(row, "content")
+        if not title or not content:
+            return None, "missing title or content"
+        return Post(author=author, title=title, content=content), None
+
+    results = ingest(stream, build, Post, batch_size)
+    # bulk_create sends no post_save signals, so retire cached pages here
+    feed_cache.invalidate(feed_cache.POSTS)
+    return results
+
+
+def ingest_comments(stream, author, batch_size):
+    def build(row):
+        content = text_field(row, "content")
+        if not content:
+            return None, "missing content"
+        try:
+            post_id = int(row.get("post_id"))
+        except (TypeError, ValueError):
+            return None, "missing or invalid post_id"
+        return Comment(author=author, post_id=post_id, content=content), None
+
+    def existing_posts(batch, results):
+        # one query per batch rather than one per row
+        wanted = {comment.post_id for _, comment in batch}
+        found = set(Post.objects.filter(id__in=wanted).values_list("id", flat=True))
+        valid = []
+        for line, comment in batch:
+            if comment.post_id in found:
+                valid.append((line, comment))
+            else:
+                results.append(
+                    {"line": line, "error": f"post {comment.post_id} does not exist"}
+                )
+        return valid
+
+    def update_counters(created):
+        post_ids = {comment.post_id for comment in created}
+        counters.recount(post_ids)
+        # bulk_create sends no post_save signals either; wait for the commit,
+        # or pages rendered from the old rows meanwhile would be kept
+        transaction.on_commit(lambda: feed_cache.invalidate_posts(post_ids))
+
+    return ingest(
+        stream, build, Comment, batch_size,
+        check_batch=existing_posts, after_batch=update_counters,
+    )
+
+
+def summary(results):
+    failed = sum(1 for result in results if "error" in result)
+    return {"created": len(results) - failed, "failed": failed, "results": results}
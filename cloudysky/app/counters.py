@@ -0,0 +1,69 @@
+"""
+Denormalised comment counters on Post.
+
+comment_count, visible_comment_count and last_comment_at are adjusted with
+F() expressions in the same statement sequence as the comment write, so
+concurrent writers never overwrite each other's increments. Bulk paths and
+`manage.py recount` rebuild them from Comment with one grouped UPDATE.
+"""
+from django.db.models import Count, DateTimeField, F, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Post
+
+# post ids per recount statement, under SQLite's bound-parameter limit
+RECOUNT_CHUNK = 900
+
+
+def comment_added(comment):
+    created_at = Value(comment.created_at, output_field=DateTimeField())
+    updates = {
+        "comment_count": F("comment_count") + 1,
+        # never backwards, even when comment transactions commit out of order
+        "last_comment_at": Greatest(Coalesce(F("last_comment_at"), created_at), created_at),
+    }
+    if not comment.is_hidden:
+        updates["visible_comment_count"] = F("visible_comment_count") + 1
+    Post.objects.filter(id=comment.post_id).update(**updates)
+
+
+def comments_hidden(post_ids, hidden):
+    """`hidden` comments spread over `post_ids` were just hidden."""
+    post_ids = list(post_ids)
+    if len(post_ids) == 1:
+        Post.objects.filter(id=post_ids[0]).update(
+            visible_comment_count=F("visible_comment_count") - hidden
+        )
+    else:
+        recount(post_ids)
+
+
+def rebuild(posts):
+    """
+    Recompute the counters of every post in `posts` with a single UPDATE
+    whose per-post values come from correlated, grouped subqueries.
+    """
+    comments = Comment.objects.filter(post=OuterRef("pk")).order_by().values("post")
+    return posts.update(
+        comment_count=Coalesce(
+            Subquery(comments.annotate(n=Count("id")).values("n")), 0
+        ),
+        visible_comment_count=Coalesce(
+            Subquery(comments.filter(is_hidden=False).annotate(n=Count("id")).values("n")),
+            0,
+        ),
+        last_comment_at=Subquery(
+            comments.annotate(last=Max("created_at")).values("last")
+        ),
+    )
+
+
+def recount(post_ids=None):
+    """Rebuild counters for `post_ids`, or for every post when None."""
+    if post_ids is None:
+        return rebuild(Post.objects.all())
+    post_ids = list(post_ids)
+    return sum(
+        rebuild(Post.objects.filter(id__in=post_ids[i:i + RECOUNT_CHUNK]))
+        for i in range(0, len(post_ids), RECOUNT_CHUNK)
+    )
@@ -0,0 +1,171 @@
+"""
+Feed assembly shared by dumpFeed, feed and post detail.
+
+Every helper here issues a fixed number of queries no matter how many
+posts or comments are involved, so the views never fall back to one
+query per post (or per author).
+
+Feeds are paged with a keyset cursor on (created_at, id) rather than
+OFFSET, so fetching page N costs the same as fetching page 1.
+"""
+import base64
+import json
+from collections import defaultdict
+from datetime import datetime
+
+from django.db.models import Case, F, Q, TextField, Value, When
+from django.db.models.functions import Coalesce, Concat, Length, Substr
+
+from .models import Comment, Post
+
+PREVIEW_LENGTH = 50
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 500
+
+
+def feed_posts():
+    """Posts in reverse-chronological order with their authors joined in."""
+    return Post.objects.select_related("author").order_by("-created_at", "-id")
+
+
+def visible_feed_rows(user):
+    """
+    The /app/feed rows `user` may see, as dicts computed entirely in SQL.
+
+    Hidden posts are filtered in the WHERE clause (staff see everything,
+    authors see their own), and the colour and 50-character preview are
+    CASE expressions, so no Post objects are built and no invisible rows
+    leave the database.
+    """
+    posts = Post.objects.order_by("-created_at", "-id")
+    if not user.is_staff:
+        posts = posts.filter(Q(is_hidden=False) | Q(author=user))
+    return posts.alias(content_length=Length("content")).annotate(
+        username=F("author__username"),
+        preview=Case(
+            When(
+                content_length__gt=PREVIEW_LENGTH,
+                then=Concat(
+                    Substr("content", 1, PREVIEW_LENGTH),
+                    Value("..."),
+                    output_field=TextField(),
+                ),
+            ),
+            default=F("content"),
+        ),
+        color=Case(
+            When(is_hidden=True, then=Value("red")),
+            When(author=user, then=Value("yellow")),
+            default=Value("green"),
+        ),
+        last_activity=Coalesce("last_comment_at", "created_at"),
+    ).values(
+        "id", "title", "username", "created_at", "preview", "color",
+        "visible_comment_count", "last_activity",
+    )
+
+
+def cursor_of(row):
+    """(created_at, id) of a feed row, whether a Post or a values() dict."""
+    if isinstance(row, dict):
+        return row["created_at"], row["id"]
+    return row.created_at, row.id
+
+
+def encode_cursor(row):
+    created_at, post_id = cursor_of(row)
+    raw = f"{created_at.isoformat()}|{post_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(token):
+    """Turn an `after` token back into a (created_at, id) pair."""
+    try:
+        raw = base64.urlsafe_b64decode(token.encode()).decode()
+        created_at, post_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(post_id)
+    except (ValueError, UnicodeError) as exc:
+        raise ValueError(f"invalid cursor: {token!r}") from exc
+
+
+def parse_limit(value):
+    """Page size from a `limit` query parameter, clamped to MAX_PAGE_SIZE."""
+    if value in (None, ""):
+        return DEFAULT_PAGE_SIZE
+    limit = int(value)
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def paginate(posts, limit, after=None):
+    """
+    One page of `posts` (ordered newest first) strictly after `after`.
+
+    Returns (page_queryset, rows, next_cursor); next_cursor is None on the
+    last page. page_queryset may be handed to comment_ids_by_post().
+    """
+    if after is not None:
+        created_at, post_id = after
+        posts = posts.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=post_id)
+        )
+    page = posts[: limit + 1]
+    rows = list(page)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1])
+    return page, rows, next_cursor
+
+
+def iter_pages(posts, page_size=STREAM_CHUNK_SIZE):
+    """Yield (page_queryset, rows) for `posts` one keyset page at a time."""
+    after = None
+    while True:
+        page, rows, next_cursor = paginate(posts, page_size, after)
+        if rows:
+            yield page, rows
+        if next_cursor is None:
+            return
+        after = cursor_of(rows[-1])
+
+
+def stream_json_array(items, prefix="[", suffix="]"):
+    """Serialise an iterable of dicts as a JSON array, one element at a time."""
+    yield prefix
+    first = True
+    for item in items:
+        if not first:
+            yield ","
+        first = False
+        yield json.dumps(item)
+    yield suffix
+
+
+def comment_ids_by_post(posts):
+    """
+    Map post id -> list of comment ids (ascending) for every post in `posts`.
+
+    `posts` is a Post queryset; it is used as a subquery so the lookup is a
+    single SELECT regardless of how many posts it matches.
+    """
+    grouped = defaultdict(list)
+    rows = (
+        Comment.objects.filter(post__in=posts.values("pk"))
+        .order_by("post_id", "id")
+        .values_list("post_id", "id")
+    )
+    for post_id, comment_id in rows:
+        grouped[post_id].append(comment_id)
+    return grouped
+
+
+def post_comments(post):
+    """Comments of `post` in creation order with their authors joined in."""
+    return (
+        Comment.objects.filter(post=post)
+        .select_related("author")
+        .order_by("created_at")
+    )
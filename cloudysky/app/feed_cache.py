@@ -0,0 +1,133 @@
+"""
+Cache of rendered feed pages.
+
+Pages are keyed by (viewer role, viewer id, page cursor) plus a generation
+number. Writes never hunt down individual keys: a post write bumps the
+POSTS generation, so every page rendered from the old data simply stops
+being looked up and ages out of the backend.
+
+Comments are far more frequent and only touch one post, so each post has
+its own comment generation instead. A page is stored with the generations
+of the posts on it, and a hit whose posts have moved on counts as a miss;
+a new comment retires only the pages showing its post. The generations
+are read right after the page is rendered, so a comment landing in that
+instant can leave a page stale until FEED_CACHE_TIMEOUT.
+
+The backend is whatever `settings.FEED_CACHE_ALIAS` names in CACHES
+(local memory by default); point it at Redis/Memcached to share pages
+between workers. Hit and miss counters live in the same backend.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+POSTS = "posts"
+
+HITS_KEY = "feed:stats:hits"
+MISSES_KEY = "feed:stats:misses"
+
+
+def get_cache():
+    return caches[getattr(settings, "FEED_CACHE_ALIAS", "default")]
+
+
+def generation(scope):
+    """Current generation for `scope`, starting it if the backend lost it."""
+    key = f"feed:gen:{scope}"
+    cache = get_cache()
+    gen = cache.get(key)
+    if gen is None:
+        # a time-based start can never collide with a generation that was
+        # evicted, so stale pages cannot come back into view
+        cache.add(key, time.time_ns(), timeout=None)
+        gen = cache.get(key)
+    return gen
+
+
+def invalidate(scope):
+    """Retire every cached page built from `scope` (POSTS)."""
+    key = f"feed:gen:{scope}"
+    try:
+        get_cache().incr(key)
+    except ValueError:
+        generation(scope)
+
+
+def post_generation_key(post_id):
+    return f"feed:gen:post:{post_id}"
+
+
+def post_generations(post_ids):
+    """Current comment generation of each of `post_ids`, starting missing ones."""
+    cache = get_cache()
+    keys = [post_generation_key(post_id) for post_id in post_ids]
+    gens = cache.get_many(keys)
+    missing = [key for key in keys if key not in gens]
+    if missing:
+        # time-based, like generation(), so an evicted one never comes back
+        start = time.time_ns()
+        for key in missing:
+            cache.add(key, start, timeout=None)
+        gens.update(cache.get_many(missing))
+    return [gens.get(key) for key in keys]
+
+
+def invalidate_posts(post_ids):
+    """Retire the cached pages showing any of `post_ids`; their comments changed."""
+    cache = get_cache()
+    for post_id in post_ids:
+        try:
+            cache.incr(post_generation_key(post_id))
+        except ValueError:
+            # not started, so no page holds it; the next start is time-based
+            pass
+
+
+def viewer(user):
+    """(role, id) part of a page key for a logged-in user."""
+    return ("admin" if user.is_staff else "serf", user.id)
+
+
+def page_key(view, viewer, limit, after):
+    role, viewer_id = viewer
+    return f"feed:{view}:{role}:{viewer_id}:{limit}:{after or ''}:{generation(POSTS)}"
+
+
+def _count(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_page(key):
+    page = None
+    entry = get_cache().get(key)
+    if entry is not None:
+        cached, post_ids, gens = entry
+        if post_generations(post_ids) == gens:
+            page = cached
+    _count(MISSES_KEY if page is None else HITS_KEY)
+    return page
+
+
+def set_page(key, page, post_ids=()):
+    """Cache `page`, which shows the comments of `post_ids`."""
+    post_ids = list(post_ids)
+    entry = (page, post_ids, post_generations(post_ids))
+    get_cache().set(key, entry, getattr(settings, "FEED_CACHE_TIMEOUT", 300))
+
+
+def stats():
+    values = get_cache().get_many([HITS_KEY, MISSES_KEY])
+    hits = values.get(HITS_KEY, 0)
+    misses = values.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / total if total else 0.0,
+    }
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from app.readiness import ensure_schema, pending_migrations
+
+
+class Command(BaseCommand):
+    help = "Apply pending migrations once, before workers start serving requests."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report; exit non-zero if migrations are pending.",
+        )
+
+    def handle(self, *args, database, check, **options):
+        if check:
+            pending = pending_migrations(database)
+            if pending:
+                raise CommandError("Pending migrations: " + ", ".join(pending))
+            self.stdout.write("Schema is up to date.")
+            return
+
+        applied = ensure_schema(database)
+        if applied:
+            self.stdout.write(f"Applied {len(applied)} migration(s).")
+        else:
+            self.stdout.write("Schema is up to date.")
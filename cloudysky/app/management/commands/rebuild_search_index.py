@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from app import search
+
+
+class Command(BaseCommand):
+    help = "Recreate the full-text search tables/triggers if missing and rebuild them."
+
+    def handle(self, *args, **options):
+        search.install()
+        self.stdout.write("Search index rebuilt.")
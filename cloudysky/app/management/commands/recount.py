@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from app.counters import recount
+
+
+class Command(BaseCommand):
+    help = "Rebuild Post comment counters from Comment (repairs drift)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "post_ids", nargs="*", type=int, help="Only these posts (default: all)."
+        )
+
+    def handle(self, *args, post_ids, **options):
+        updated = recount(post_ids or None)
+        self.stdout.write(f"Recounted {updated} post(s).")
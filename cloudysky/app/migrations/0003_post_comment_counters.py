@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:44
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    # the grouped UPDATE of app.counters.rebuild, frozen against the
+    # historical models so later changes there cannot alter this migration
+    Post = apps.get_model("app", "Post")
+    Comment = apps.get_model("app", "Comment")
+    comments = Comment.objects.filter(post=OuterRef("pk")).order_by().values("post")
+    Post.objects.update(
+        comment_count=Coalesce(
+            Subquery(comments.annotate(n=Count("id")).values("n")), 0
+        ),
+        visible_comment_count=Coalesce(
+            Subquery(comments.filter(is_hidden=False).annotate(n=Count("id")).values("n")),
+            0,
+        ),
+        last_comment_at=Subquery(
+            comments.annotate(last=Max("created_at")).values("last")
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_post_comment_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='last_comment_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='visible_comment_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+from django.db import migrations
+
+# The schema as of this migration, spelled out rather than taken from
+# app.search, so later changes there cannot alter what it did.
+INSTALL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS app_post_fts USING fts5("
+    "title, content, content='app_post', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS app_post_fts_ai AFTER INSERT ON app_post BEGIN "
+    "INSERT INTO app_post_fts(rowid, title, content) "
+    "VALUES (new.id, new.title, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS app_post_fts_ad AFTER DELETE ON app_post BEGIN "
+    "INSERT INTO app_post_fts(app_post_fts, rowid, title, content) "
+    "VALUES ('delete', old.id, old.title, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS app_post_fts_au AFTER UPDATE OF title, content ON app_post BEGIN "
+    "INSERT INTO app_post_fts(app_post_fts, rowid, title, content) "
+    "VALUES ('delete', old.id, old.title, old.content); "
+    "INSERT INTO app_post_fts(rowid, title, content) "
+    "VALUES (new.id, new.title, new.content); END",
+    "INSERT INTO app_post_fts(app_post_fts) VALUES ('rebuild')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS app_comment_fts USING fts5("
+    "content, content='app_comment', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS app_comment_fts_ai AFTER INSERT ON app_comment BEGIN "
+    "INSERT INTO app_comment_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS app_comment_fts_ad AFTER DELETE ON app_comment BEGIN "
+    "INSERT INTO app_comment_fts(app_comment_fts, rowid, content) "
+    "VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS app_comment_fts_au AFTER UPDATE OF content ON app_comment BEGIN "
+    "INSERT INTO app_comment_fts(app_comment_fts, rowid, content) "
+    "VALUES ('delete', old.id, old.content); "
+    "INSERT INTO app_comment_fts(rowid, content) VALUES (new.id, new.content); END",
+    "INSERT INTO app_comment_fts(app_comment_fts) VALUES ('rebuild')",
+]
+
+UNINSTALL = [
+    f"DROP TRIGGER IF EXISTS {fts}_{suffix}"
+    for fts in ("app_post_fts", "app_comment_fts")
+    for suffix in ("ai", "ad", "au")
+] + [
+    "DROP TABLE IF EXISTS app_post_fts",
+    "DROP TABLE IF EXISTS app_comment_fts",
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        # FTS5 is SQLite-only; other backends get no search index
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_post_comment_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(INSTALL), run(UNINSTALL)),
+    ]
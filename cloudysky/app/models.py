@@ -33,6 +33,22 @@ class Post(models.Model):
     hidden_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='hidden_posts')
     hidden_at = models.DateTimeField(null=True, blank=True)
     hidden_reason = models.ForeignKey(ModerationReason, on_delete=models.SET_NULL, null=True, blank=True)
+    # denormalised from Comment (see app/counters.py); `manage.py recount` repairs drift
+    comment_count = models.IntegerField(default=0)
+    visible_comment_count = models.IntegerField(default=0)
+    last_comment_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # feed (all posts, newest first) and its keyset cursor
+            models.Index(fields=["-created_at", "-id"], name="post_recent_idx"),
+            # dumpFeed only ever reads visible posts
+            models.Index(
+                fields=["-created_at", "-id"],
+                name="post_visible_recent_idx",
+                condition=models.Q(is_hidden=False),
+            ),
+        ]
 
 class Comment(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -44,6 +60,12 @@ class Comment(models.Model):
     hidden_at = models.DateTimeField(null=True, blank=True)
     hidden_reason = models.ForeignKey(ModerationReason, on_delete=models.SET_NULL, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # post detail lists a post's comments oldest first
+            models.Index(fields=["post", "created_at"], name="comment_post_created_idx"),
+        ]
+
 class Media(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, null=True, blank=True)
     comment = models.ForeignKey(Comment, on_delete=models.CASCADE, null=True, blank=True)
@@ -0,0 +1,76 @@
+"""
+Hiding posts and comments.
+
+Every hide, single or bulk, is one UPDATE over the selected rows that
+stamps the moderator, reason and time; rows are never fetched and saved
+back whole.
+"""
+from django.utils import timezone
+
+from django.db import transaction
+
+from . import counters, feed_cache
+from .models import Comment, ModerationReason, Post
+
+# the ids are bound into one UPDATE, so keep under the 999 parameters older
+# SQLite (before 3.32) allows per statement, the same cap counters uses
+MAX_IDS = counters.RECOUNT_CHUNK
+
+
+def reason_for(text):
+    if not text:
+        return None
+    # reason_text is not unique, and concurrent hides may each have created
+    # a row; any of them will do, where get_or_create() would raise
+    reason = ModerationReason.objects.filter(reason_text=text).order_by("id").first()
+    if reason is None:
+        reason = ModerationReason.objects.create(reason_text=text)
+    return reason
+
+
+def hide(queryset, moderator, reason_text=""):
+    """Hide every not-yet-hidden row of `queryset`; returns how many changed."""
+    reason = reason_for(reason_text)
+    rows = queryset.filter(is_hidden=False)
+    with transaction.atomic():
+        if queryset.model is Comment:
+            post_ids = set(rows.values_list("post_id", flat=True))
+        changed = rows.update(
+            is_hidden=True,
+            hidden_by=moderator,
+            hidden_at=timezone.now(),
+            hidden_reason=reason,
+        )
+        if changed and queryset.model is Comment:
+            counters.comments_hidden(post_ids, changed)
+    if changed:
+        # update() sends no post_save signals
+        if queryset.model is Post:
+            feed_cache.invalidate(feed_cache.POSTS)
+        else:
+            feed_cache.invalidate_posts(post_ids)
+    return changed
+
+
+def select(model, ids=None, author=None):
+    """
+    Rows of `model` matching the given ids and/or author username.
+
+    Raises ValueError when neither is given or the ids are not integers.
+    """
+    if not ids and not author:
+        raise ValueError("give ids and/or author")
+    queryset = model.objects.all()
+    if ids:
+        if not isinstance(ids, (list, tuple)):
+            raise ValueError("ids must be a list")
+        if len(ids) > MAX_IDS:
+            raise ValueError(f"at most {MAX_IDS} ids per request")
+        try:
+            ids = [int(i) for i in ids]
+        except (TypeError, ValueError):
+            raise ValueError("ids must be integers")
+        queryset = queryset.filter(id__in=ids)
+    if author:
+        queryset = queryset.filter(author__username=author)
+    return queryset
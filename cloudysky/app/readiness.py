@@ -0,0 +1,90 @@
+"""
+Schema readiness.
+
+Schema work (migrate) happens once, when a server process starts or when
+`manage.py ensure_schema` runs -- never inside a request. Requests only
+read the cached readiness flag through /app/health.
+"""
+import logging
+
+from django.conf import settings
+from django.core.checks import Warning
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+
+try:
+    import fcntl
+except ImportError:  # not on POSIX; fall back to no cross-process lock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_ready = False
+
+
+def pending_migrations(database=DEFAULT_DB_ALIAS):
+    """Names of migrations that have not been applied to `database`."""
+    executor = MigrationExecutor(connections[database])
+    targets = executor.loader.graph.leaf_nodes()
+    return [
+        f"{migration.app_label}.{migration.name}"
+        for migration, _ in executor.migration_plan(targets)
+    ]
+
+
+def is_ready(database=DEFAULT_DB_ALIAS):
+    """True once the schema is known to be up to date; cached after that."""
+    global _ready
+    if not _ready:
+        _ready = not pending_migrations(database)
+    return _ready
+
+
+def ensure_schema(database=DEFAULT_DB_ALIAS):
+    """
+    Apply pending migrations, holding a file lock so that several workers
+    starting at once run them one after another instead of concurrently.
+    Returns the migrations that were pending.
+    """
+    global _ready
+    lock_path = getattr(settings, "SCHEMA_LOCK_FILE", None)
+    lock = open(lock_path, "w") if lock_path and fcntl else None
+    try:
+        if lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        pending = pending_migrations(database)
+        if pending:
+            logger.info("Applying %d pending migrations", len(pending))
+            call_command("migrate", database=database, interactive=False, verbosity=0)
+        _ready = True
+        return pending
+    finally:
+        if lock:
+            lock.close()
+
+
+def startup():
+    """Called once per server process (wsgi.py / asgi.py)."""
+    if getattr(settings, "MIGRATE_ON_STARTUP", False):
+        ensure_schema()
+    elif not is_ready():
+        logger.warning(
+            "Database schema is out of date; run `manage.py ensure_schema`"
+        )
+
+
+def schema_check(app_configs=None, databases=None, **kwargs):
+    """System check for `check --deploy --database default` (see AppConfig.ready)."""
+    messages = []
+    for database in databases or []:
+        pending = pending_migrations(database)
+        if pending:
+            messages.append(
+                Warning(
+                    f"{len(pending)} unapplied migration(s) on '{database}'",
+                    hint="Run `manage.py ensure_schema` before starting workers.",
+                    id="app.W001",
+                )
+            )
+    return messages
@@ -0,0 +1,174 @@
+"""
+Full-text search over posts and comments.
+
+Each table has an SQLite FTS5 index (an external-content table, so the
+text is not stored twice) kept in sync by triggers. Triggers fire for
+every write, including bulk_create and queryset.update(), which model
+signals would miss.
+
+Django rebuilds an SQLite table for some schema changes (adding most
+fields, for one), which drops its triggers. A post_migrate receiver
+re-creates any that are missing after every `migrate`;
+`manage.py rebuild_search_index` also re-indexes every row from scratch.
+"""
+import re
+from datetime import datetime, timezone
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# (fts table, source table, indexed columns)
+INDEXES = [
+    ("app_post_fts", "app_post", ("title", "content")),
+    ("app_comment_fts", "app_comment", ("content",)),
+]
+
+
+def table_statement(fts, table, columns):
+    cols = ", ".join(columns)
+    return (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{cols}, content='{table}', content_rowid='id')"
+    )
+
+
+def trigger_statements(fts, table, columns):
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    delete = f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old});"
+    insert = f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new});"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} "
+        f"BEGIN {delete} {insert} END",
+    ]
+
+
+def install(schema_connection=None):
+    """Create the FTS tables and triggers if missing, then (re)build them."""
+    schema_connection = schema_connection or connection
+    if schema_connection.vendor != "sqlite":
+        return
+    with schema_connection.cursor() as cursor:
+        for fts, table, columns in INDEXES:
+            cursor.execute(table_statement(fts, table, columns))
+            for statement in trigger_statements(fts, table, columns):
+                cursor.execute(statement)
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def restore_triggers(using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    post_migrate receiver: re-create the triggers a table rebuild dropped.
+
+    Only indexes whose FTS table exists are touched, so this never runs
+    ahead of (or undoes the rollback of) the migration that adds them.
+    Rows were copied with their ids, so the index itself is still valid.
+    """
+    schema_connection = connections[using]
+    if schema_connection.vendor != "sqlite":
+        return
+    with schema_connection.cursor() as cursor:
+        for fts, table, columns in INDEXES:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [fts]
+            )
+            if cursor.fetchone() is None:
+                continue
+            for statement in trigger_statements(fts, table, columns):
+                cursor.execute(statement)
+
+
+def to_fts_query(q):
+    """
+    Turn user input into an FTS5 MATCH expression: "quoted text" stays a
+    phrase, every other word becomes a quoted term, and all of them must
+    match. Quoting everything means punctuation never hits FTS5 syntax.
+    """
+    parts = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', q):
+        text = (phrase or word).replace('"', "").strip()
+        if text:
+            parts.append(f'"{text}"')
+    return " ".join(parts)
+
+
+def iso(value):
+    """ISO timestamp of a DateTimeField value read through a raw cursor (UTC)."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.isoformat()
+
+
+def visibility(user, alias):
+    """SQL condition and params limiting `alias` rows to what `user` may see."""
+    if user.is_staff:
+        return "1", []
+    return f"({alias}.is_hidden = 0 OR {alias}.author_id = %s)", [user.id]
+
+
+def search_posts(user, match, limit):
+    where, params = visibility(user, "p")
+    sql = f"""
+        SELECT p.id, p.title, u.username, p.created_at,
+               snippet(app_post_fts, 1, '[', ']', '...', 12),
+               bm25(app_post_fts, 2.0, 1.0) AS rank
+        FROM app_post_fts
+        JOIN app_post p ON p.id = app_post_fts.rowid
+        JOIN auth_user u ON u.id = p.author_id
+        WHERE app_post_fts MATCH %s AND {where}
+        ORDER BY rank
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, *params, limit])
+        rows = cursor.fetchall()
+    return [
+        {
+            "id": post_id,
+            "title": title,
+            "username": username,
+            "date": iso(created_at),
+            "snippet": snippet,
+            "score": -rank,
+        }
+        for post_id, title, username, created_at, snippet, rank in rows
+    ]
+
+
+def search_comments(user, match, limit):
+    # a comment is visible if it and its post are both visible to the user
+    comment_where, comment_params = visibility(user, "c")
+    post_where, post_params = visibility(user, "p")
+    sql = f"""
+        SELECT c.id, c.post_id, u.username, c.created_at,
+               snippet(app_comment_fts, 0, '[', ']', '...', 12),
+               bm25(app_comment_fts) AS rank
+        FROM app_comment_fts
+        JOIN app_comment c ON c.id = app_comment_fts.rowid
+        JOIN app_post p ON p.id = c.post_id
+        JOIN auth_user u ON u.id = c.author_id
+        WHERE app_comment_fts MATCH %s AND {comment_where} AND {post_where}
+        ORDER BY rank
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, *comment_params, *post_params, limit])
+        rows = cursor.fetchall()
+    return [
+        {
+            "id": comment_id,
+            "post_id": post_id,
+            "username": username,
+            "date": iso(created_at),
+            "snippet": snippet,
+            "score": -rank,
+        }
+        for comment_id, post_id, username, created_at, snippet, rank in rows
+    ]
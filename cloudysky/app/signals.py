@@ -0,0 +1,25 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import counters, feed_cache
+from .models import Comment, Post
+
+
+@receiver([post_save, post_delete], sender=Post)
+def post_changed(sender, **kwargs):
+    feed_cache.invalidate(feed_cache.POSTS)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    # after the commit, so no page rendered from the old rows can be cached
+    # under the new generation
+    post_id = instance.post_id
+    transaction.on_commit(lambda: feed_cache.invalidate_posts([post_id]))
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.comment_added(instance)
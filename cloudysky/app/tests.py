@@ -0,0 +1,715 @@
+import json
+import re
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from . import counters, feed_cache, hashers, moderation, readiness
+from .feed import feed_posts, paginate, post_comments, visible_feed_rows
+from .models import Comment, ModerationReason, Post
+
+
+def make_posts(author, count, comments_per_post=2):
+    for i in range(count):
+        post = Post.objects.create(author=author, title=f"t{i}", content=f"c{i}")
+        for j in range(comments_per_post):
+            Comment.objects.create(author=author, post=post, content=f"r{j}")
+
+
+class FeedTestCase(TestCase):
+    def setUp(self):
+        # pages cached by earlier tests must not leak into this one
+        feed_cache.get_cache().clear()
+
+
+class FeedQueryCountTests(FeedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("serf", password="pw")
+        self.client.force_login(self.user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_dump_feed_query_count_is_constant(self):
+        make_posts(self.user, 3)
+        small = self.count_queries("/app/dumpFeed/")
+        make_posts(self.user, 30)
+        self.assertEqual(self.count_queries("/app/dumpFeed/"), small)
+
+    def test_feed_query_count_is_constant(self):
+        make_posts(self.user, 3)
+        small = self.count_queries("/app/feed")
+        make_posts(self.user, 30)
+        self.assertEqual(self.count_queries("/app/feed"), small)
+
+    def test_post_detail_query_count_is_constant(self):
+        post = Post.objects.create(author=self.user, title="t", content="c")
+        Comment.objects.create(author=self.user, post=post, content="r")
+        small = self.count_queries(f"/app/post/{post.id}")
+        for i in range(20):
+            other = User.objects.create_user(f"u{i}")
+            Comment.objects.create(author=other, post=post, content="r")
+        self.assertEqual(self.count_queries(f"/app/post/{post.id}"), small)
+
+    def test_dump_feed_lists_comment_ids(self):
+        make_posts(self.user, 2)
+        data = self.client.get("/app/dumpFeed/").json()
+        self.assertEqual(len(data), 2)
+        for item in data:
+            expected = list(
+                Comment.objects.filter(post_id=item["id"])
+                .order_by("id")
+                .values_list("id", flat=True)
+            )
+            self.assertEqual(item["comments"], expected)
+
+
+class FeedPaginationTests(FeedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("serf", password="pw")
+        self.client.force_login(self.user)
+        make_posts(self.user, 7, comments_per_post=1)
+        # force timestamp ties so the id tiebreaker is exercised
+        first = Post.objects.order_by("id").first()
+        Post.objects.filter(id__lte=first.id + 3).update(created_at=first.created_at)
+
+    def walk(self, url):
+        ids, after = [], None
+        while True:
+            query = f"{url}?limit=3" + (f"&after={after}" if after else "")
+            response = self.client.get(query)
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            if isinstance(body, dict):
+                ids += [p["id"] for p in body["posts"]]
+                after = body["next"]
+            else:
+                ids += [p["id"] for p in body]
+                after = response.get("X-Next-Cursor")
+            if not after:
+                return ids
+
+    def test_dump_feed_pages_cover_feed_once(self):
+        full = [p["id"] for p in self.client.get("/app/dumpFeed/").json()]
+        self.assertEqual(self.walk("/app/dumpFeed/"), full)
+
+    def test_feed_pages_cover_feed_once(self):
+        full = [p["id"] for p in self.client.get("/app/feed").json()["posts"]]
+        self.assertEqual(self.walk("/app/feed"), full)
+
+    def test_stream_matches_full_response(self):
+        full = self.client.get("/app/dumpFeed/").json()
+        response = self.client.get("/app/dumpFeed/?stream=1")
+        streamed = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(streamed, full)
+
+        full = self.client.get("/app/feed").json()
+        response = self.client.get("/app/feed?stream=1")
+        self.assertEqual(json.loads(b"".join(response.streaming_content)), full)
+
+    def test_bad_cursor_is_rejected(self):
+        response = self.client.get("/app/dumpFeed/?after=not-a-cursor")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get("/app/feed?limit=0")
+        self.assertEqual(response.status_code, 400)
+
+
+class FeedVisibilityTests(FeedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.me = User.objects.create_user("me")
+        self.other = User.objects.create_user("other")
+        self.admin = User.objects.create_user("boss", is_staff=True)
+        self.mine = Post.objects.create(author=self.me, title="a", content="x" * 51)
+        self.theirs = Post.objects.create(author=self.other, title="b", content="é" * 50)
+        self.hidden = Post.objects.create(
+            author=self.other, title="c", content="gone", is_hidden=True
+        )
+        self.my_hidden = Post.objects.create(
+            author=self.me, title="d", content="mine", is_hidden=True
+        )
+
+    def rows(self, user):
+        return {row["id"]: row for row in visible_feed_rows(user)}
+
+    def test_hidden_posts_filtered_in_sql(self):
+        self.assertEqual(
+            set(self.rows(self.me)), {self.mine.id, self.theirs.id, self.my_hidden.id}
+        )
+        self.assertEqual(len(self.rows(self.admin)), 4)
+
+    def test_color_and_preview(self):
+        rows = self.rows(self.me)
+        self.assertEqual(rows[self.mine.id]["color"], "yellow")
+        self.assertEqual(rows[self.theirs.id]["color"], "green")
+        self.assertEqual(rows[self.my_hidden.id]["color"], "red")
+        self.assertEqual(rows[self.mine.id]["preview"], "x" * 50 + "...")
+        self.assertEqual(rows[self.theirs.id]["preview"], "é" * 50)
+        self.assertEqual(self.rows(self.admin)[self.hidden.id]["color"], "red")
+
+    def test_feed_view_returns_sql_rows(self):
+        self.client.force_login(self.me)
+        posts = self.client.get("/app/feed").json()["posts"]
+        self.assertEqual(
+            [p["id"] for p in posts], [self.my_hidden.id, self.theirs.id, self.mine.id]
+        )
+        self.assertEqual(posts[-1]["username"], "me")
+
+
+class QueryPlanTests(TestCase):
+    """The hot feed queries must be served by index scans, never full scans or sorts."""
+
+    def setUp(self):
+        self.user = User.objects.create_user("serf")
+        make_posts(self.user, 5)
+        self.post = Post.objects.first()
+
+    def assertIndexed(self, queryset):
+        plan = queryset.explain()
+        self.assertNotIn("TEMP B-TREE", plan)
+        for line in plan.splitlines():
+            if re.search(r"SCAN (app_post|app_comment|U\d+)\b", line):
+                self.assertIn("USING", line, plan)
+        self.assertIn("INDEX", plan)
+
+    def test_dump_feed_uses_visible_index(self):
+        posts = feed_posts().filter(is_hidden=False)
+        self.assertIndexed(posts)
+        self.assertIn("post_visible_recent_idx", posts.explain())
+
+    def test_feed_page_uses_recency_index(self):
+        posts = visible_feed_rows(self.user)
+        self.assertIndexed(posts[:51])
+        created_at = self.post.created_at
+        after = posts.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=self.post.id)
+        )
+        self.assertIndexed(after[:51])
+
+    def test_comment_queries_use_post_indexes(self):
+        self.assertIndexed(post_comments(self.post))
+        page, _, _ = paginate(feed_posts().filter(is_hidden=False), 3)
+        self.assertIndexed(
+            Comment.objects.filter(post__in=page.values("pk"))
+            .order_by("post_id", "id")
+            .values_list("post_id", "id")
+        )
+
+
+class FeedCacheTests(FeedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("serf")
+        self.admin = User.objects.create_user("boss", is_staff=True)
+        self.client.force_login(self.user)
+        make_posts(self.user, 3, comments_per_post=0)
+
+    def test_second_request_is_served_from_cache(self):
+        first = self.client.get("/app/feed?limit=2").json()
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get("/app/feed?limit=2").json()
+        self.assertEqual(first, second)
+        self.assertFalse(
+            [q for q in ctx.captured_queries if "app_post" in q["sql"]]
+        )
+        self.assertEqual(feed_cache.stats()["hits"], 1)
+        self.assertEqual(feed_cache.stats()["misses"], 1)
+
+    def test_unpaginated_feed_is_not_cached(self):
+        self.client.get("/app/feed")
+        self.client.get("/app/feed")
+        self.assertEqual(feed_cache.stats(), {"hits": 0, "misses": 0, "hit_ratio": 0.0})
+
+    def test_pages_are_per_viewer(self):
+        mine = self.client.get("/app/feed?limit=10").json()["posts"]
+        self.client.force_login(self.admin)
+        theirs = self.client.get("/app/feed?limit=10").json()["posts"]
+        self.assertEqual({p["color"] for p in mine}, {"yellow"})
+        self.assertEqual({p["color"] for p in theirs}, {"green"})
+
+    def test_create_and_hide_post_invalidate(self):
+        self.assertEqual(len(self.client.get("/app/feed?limit=10").json()["posts"]), 3)
+        self.client.post("/app/createPost/", {"title": "new", "content": "x"})
+        self.assertEqual(len(self.client.get("/app/feed?limit=10").json()["posts"]), 4)
+
+        other = User.objects.create_user("other")
+        self.client.force_login(other)
+        self.assertEqual(len(self.client.get("/app/feed?limit=10").json()["posts"]), 4)
+        self.client.force_login(self.admin)
+        post = Post.objects.first()
+        self.client.post("/app/hidePost/", {"post_id": post.id})
+        self.client.force_login(other)
+        self.assertEqual(len(self.client.get("/app/feed?limit=10").json()["posts"]), 3)
+
+    def comment(self, post):
+        # comment invalidation waits for the commit, which TestCase never does
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/app/createComment/", {"post_id": post.id, "content": "hi"})
+
+    def test_create_comment_invalidates_dump_pages(self):
+        post = Post.objects.first()
+        before = self.client.get("/app/dumpFeed/?limit=10").json()
+        self.comment(post)
+        after = self.client.get("/app/dumpFeed/?limit=10").json()
+        self.assertNotEqual(before, after)
+
+    def test_comment_invalidates_only_after_commit(self):
+        post = Post.objects.first()
+        before = feed_cache.post_generations([post.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(author=self.user, post=post, content="hi")
+            # a page rendered now still sees the old rows, and must not be
+            # stored under a generation that claims to include the comment
+            self.assertEqual(feed_cache.post_generations([post.id]), before)
+        self.assertNotEqual(feed_cache.post_generations([post.id]), before)
+
+    def test_comment_retires_only_pages_showing_its_post(self):
+        newest, older = Post.objects.order_by("-created_at", "-id")[:2]
+        first = self.client.get("/app/feed?limit=1").json()
+        self.comment(older)
+        self.assertEqual(self.client.get("/app/feed?limit=1").json(), first)
+        self.assertEqual(feed_cache.stats()["hits"], 1)
+
+        self.comment(newest)
+        self.assertEqual(
+            self.client.get("/app/feed?limit=1").json()["posts"][0]["comment_count"], 1
+        )
+        self.assertEqual(feed_cache.stats()["hits"], 1)
+
+    def test_stats_are_staff_only(self):
+        self.assertEqual(self.client.get("/app/feedCacheStats").status_code, 401)
+        self.client.force_login(self.admin)
+        self.assertEqual(
+            set(self.client.get("/app/feedCacheStats").json()),
+            {"hits", "misses", "hit_ratio"},
+        )
+
+
+class ReadinessTests(TestCase):
+    def setUp(self):
+        readiness._ready = False
+
+    def test_health_ok_when_migrated(self):
+        response = self.client.get("/app/health")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"status": "ok"})
+
+    def test_health_unavailable_with_pending_migrations(self):
+        with mock.patch.object(
+            readiness, "pending_migrations", return_value=["app.9999_new"]
+        ):
+            self.assertEqual(self.client.get("/app/health").status_code, 503)
+
+    def test_ensure_schema_check(self):
+        out = StringIO()
+        call_command("ensure_schema", "--check", stdout=out)
+        self.assertIn("up to date", out.getvalue())
+
+    def test_create_user_never_migrates(self):
+        with mock.patch("django.db.migrations.executor.MigrationExecutor.migrate") as migrate:
+            response = self.client.post(
+                "/app/createUser/",
+                {"email": "a@b.c", "user_name": "new", "password": "pw"},
+            )
+        self.assertEqual(response.status_code, 200)
+        migrate.assert_not_called()
+
+
+class SignupHashingTests(TestCase):
+    def test_create_user_hashes_once_and_logs_in(self):
+        with mock.patch.object(
+            hashers.PBKDF2PasswordHasher, "verify"
+        ) as verify, mock.patch.object(
+            hashers.PBKDF2PasswordHasher,
+            "encode",
+            autospec=True,
+            side_effect=hashers.PBKDF2PasswordHasher.encode,
+        ) as encode:
+            response = self.client.post(
+                "/app/createUser/",
+                {"email": "a@b.c", "user_name": "new", "password": "pw"},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(encode.call_count, 1)
+        verify.assert_not_called()
+        user = User.objects.get(username="new")
+        self.assertEqual(int(self.client.session["_auth_user_id"]), user.id)
+        self.assertTrue(user.check_password("pw"))
+
+    @override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+    def test_cost_comes_from_settings(self):
+        user = User.objects.create_user("cheap", password="pw")
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$1000$"))
+        self.assertTrue(user.check_password("pw"))
+
+
+class BulkIngestTests(FeedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user("importer")
+        self.client.force_login(self.user)
+
+    def ndjson(self, url, lines):
+        body = "\n".join(
+            line if isinstance(line, str) else json.dumps(line) for line in lines
+        )
+        return self.client.post(url, body, content_type="application/x-ndjson")
+
+    def test_bulk_posts_in_batches(self):
+        lines = [{"title": f"t{i}", "content": f"c{i}"} for i in range(7)]
+        lines.insert(3, {"title": "no content"})
+        lines.insert(5, "{not json")
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.ndjson("/app/bulkCreatePosts?batch_size=3", lines)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body["created"], body["failed"]), (7, 2))
+        self.assertEqual([r["line"] for r in body["results"]], list(range(1, 10)))
+        self.assertIn("error", body["results"][3])
+        self.assertIn("error", body["results"][5])
+        ids = [r["id"] for r in body["results"] if "id" in r]
+        self.assertEqual(Post.objects.filter(id__in=ids).count(), 7)
+        inserts = [q for q in ctx.captured_queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 3)
+
+    def test_bulk_comments_check_post_ids(self):
+        post = Post.objects.create(author=self.user, title="t", content="c")
+        response = self.ndjson("/app/bulkCreateComments", [
+            {"post_id": post.id, "content": "one"},
+            {"post_id": post.id + 100, "content": "orphan"},
+            {"post_id": "x", "content": "bad id"},
+            {"post_id": post.id, "content": "two"},
+        ])
+        body = response.json()
+        self.assertEqual((body["created"], body["failed"]), (2, 2))
+        self.assertEqual(post.comment_set.count(), 2)
+        self.assertIn("does not exist", body["results"][1]["error"])
+
+    def test_bulk_posts_invalidate_feed_cache(self):
+        self.assertEqual(self.client.get("/app/feed").json()["posts"], [])
+        self.ndjson("/app/bulkCreatePosts", [{"title": "t", "content": "c"}])
+        self.assertEqual(len(self.client.get("/app/feed").json()["posts"]), 1)
+
+    def test_bulk_requires_login(self):
+        self.client.logout()
+        response = self.ndjson("/app/bulkCreatePosts", [{"title": "t", "content": "c"}])
+        self.assertEqual(response.status_code, 401)
+
+
+class ModerationTests(FeedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user("boss", is_staff=True)
+        self.spammer = User.objects.create_user("spammer")
+        self.serf = User.objects.create_user("serf")
+        self.client.force_login(self.admin)
+        make_posts(self.spammer, 4)
+        make_posts(self.serf, 2)
+
+    def bulk_hide(self, url, body):
+        return self.client.post(url, json.dumps(body), content_type="application/json")
+
+    def test_hide_post_records_moderation(self):
+        post = Post.objects.filter(author=self.serf).first()
+        self.client.post("/app/hidePost/", {"post_id": post.id, "reason": "rude"})
+        post.refresh_from_db()
+        self.assertTrue(post.is_hidden)
+        self.assertEqual(post.hidden_by, self.admin)
+        self.assertIsNotNone(post.hidden_at)
+        self.assertEqual(post.hidden_reason.reason_text, "rude")
+
+    def test_duplicate_reasons_are_reused(self):
+        first = ModerationReason.objects.create(reason_text="spam")
+        ModerationReason.objects.create(reason_text="spam")
+        post = Post.objects.filter(author=self.serf).first()
+        response = self.client.post("/app/hidePost/", {"post_id": post.id, "reason": "spam"})
+        self.assertEqual(response.status_code, 200)
+        post.refresh_from_db()
+        self.assertEqual(post.hidden_reason, first)
+
+    def test_hide_missing_post_is_still_ok(self):
+        response = self.client.post("/app/hidePost/", {"post_id": "nope"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_bulk_hide_by_ids_is_one_update(self):
+        ids = list(Post.objects.filter(author=self.spammer).values_list("id", flat=True))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.bulk_hide(
+                "/app/bulkHidePosts", {"ids": ids[:3], "reason": "spam"}
+            )
+        self.assertEqual(response.json()["hidden"], 3)
+        updates = [q for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Post.objects.filter(is_hidden=True).count(), 3)
+        self.assertEqual(ModerationReason.objects.get().reason_text, "spam")
+
+        # already-hidden rows are not counted again
+        response = self.bulk_hide("/app/bulkHidePosts", {"author": "spammer"})
+        self.assertEqual(response.json()["hidden"], 1)
+
+    def test_bulk_hide_comments_by_author(self):
+        response = self.bulk_hide("/app/bulkHideComments", {"author": "spammer"})
+        self.assertEqual(response.json()["hidden"], 8)
+        self.assertFalse(Comment.objects.filter(author=self.serf, is_hidden=True).exists())
+        self.assertEqual(
+            set(Comment.objects.filter(is_hidden=True).values_list("hidden_by", flat=True)),
+            {self.admin.id},
+        )
+
+    def test_bulk_hide_rejects_bad_requests(self):
+        self.assertEqual(self.bulk_hide("/app/bulkHidePosts", {}).status_code, 400)
+        self.assertEqual(
+            self.bulk_hide("/app/bulkHidePosts", {"ids": ["x"]}).status_code, 400
+        )
+        too_many = list(range(1, moderation.MAX_IDS + 2))
+        self.assertEqual(
+            self.bulk_hide("/app/bulkHidePosts", {"ids": too_many}).status_code, 400
+        )
+        self.assertEqual(
+            self.bulk_hide("/app/bulkHidePosts", {"ids": too_many[:-1]}).status_code, 200
+        )
+        self.client.force_login(self.serf)
+        self.assertEqual(
+            self.bulk_hide("/app/bulkHidePosts", {"ids": [1]}).status_code, 401
+        )
+
+    def test_bulk_hide_invalidates_feed_cache(self):
+        self.client.force_login(self.serf)
+        self.assertEqual(len(self.client.get("/app/feed").json()["posts"]), 6)
+        self.client.force_login(self.admin)
+        self.bulk_hide("/app/bulkHidePosts", {"author": "spammer"})
+        self.client.force_login(self.serf)
+        self.assertEqual(len(self.client.get("/app/feed").json()["posts"]), 2)
+
+
+class BulkIngestRaceTests(TransactionTestCase):
+    def test_post_deleted_mid_upload_is_a_conflict(self):
+        user = User.objects.create_user("importer")
+        self.client.force_login(user)
+        post = Post.objects.create(author=user, title="t", content="c")
+
+        def delete_post(post_ids):
+            # skip the ORM cascade, as a concurrent delete would leave the new rows
+            Post.objects.filter(id=post.id)._raw_delete(connection.alias)
+
+        body = json.dumps({"post_id": post.id, "content": "late"})
+        with mock.patch("app.bulk.counters.recount", side_effect=delete_post):
+            response = self.client.post(
+                "/app/bulkCreateComments", body, content_type="application/x-ndjson"
+            )
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Comment.objects.exists())
+        self.assertTrue(Post.objects.filter(id=post.id).exists())
+
+
+class CreateCommentTests(TransactionTestCase):
+    # a real transaction per request, so the deferred FK check actually runs
+
+    def setUp(self):
+        self.user = User.objects.create_user("serf")
+        self.client.force_login(self.user)
+        self.post = Post.objects.create(author=self.user, title="t", content="c")
+
+    def test_comment_insert_does_not_fetch_post(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                "/app/createComment/", {"post_id": self.post.id, "content": "hi"}
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(
+            [q for q in ctx.captured_queries if 'FROM "app_post"' in q["sql"]]
+        )
+        self.assertEqual(self.post.comment_set.get().content, "hi")
+
+    def test_unknown_post_is_rejected(self):
+        response = self.client.post(
+            "/app/createComment/", {"post_id": self.post.id + 1, "content": "hi"}
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_missing_post_id_is_rejected(self):
+        response = self.client.post("/app/createComment/", {"content": "hi"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Post.objects.count(), 1)
+
+    @override_settings(COMMENT_POST_FALLBACK=True)
+    def test_fallback_mode_uses_first_post(self):
+        response = self.client.post(
+            "/app/createComment/", {"post_id": "junk", "content": "hi"}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.post.comment_set.count(), 1)
+
+
+class CommentCounterTests(FeedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user("boss", is_staff=True)
+        self.user = User.objects.create_user("serf")
+        self.client.force_login(self.user)
+        self.post = Post.objects.create(author=self.user, title="t", content="c")
+        self.other = Post.objects.create(author=self.user, title="u", content="d")
+
+    def counts(self, post):
+        post.refresh_from_db()
+        return post.comment_count, post.visible_comment_count
+
+    def test_create_and_hide_maintain_counters(self):
+        for text in ("a", "b"):
+            self.client.post(
+                "/app/createComment/", {"post_id": self.post.id, "content": text}
+            )
+        self.assertEqual(self.counts(self.post), (2, 2))
+        last = Comment.objects.latest("id")
+        self.assertEqual(self.post.last_comment_at, last.created_at)
+
+        self.client.force_login(self.admin)
+        self.client.post("/app/hideComment/", {"comment_id": last.id})
+        self.client.post("/app/hideComment/", {"comment_id": last.id})
+        self.assertEqual(self.counts(self.post), (2, 1))
+
+    def test_last_comment_at_never_moves_back(self):
+        newer = Comment.objects.create(author=self.user, post=self.post, content="a")
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.last_comment_at, newer.created_at)
+
+        # an older comment whose transaction commits last
+        older = Comment(author=self.user, post=self.post, content="b")
+        older.created_at = newer.created_at - timedelta(seconds=5)
+        counters.comment_added(older)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.last_comment_at, newer.created_at)
+        self.assertEqual(self.post.comment_count, 2)
+
+    def test_bulk_paths_maintain_counters(self):
+        body = "\n".join(
+            json.dumps({"post_id": post.id, "content": "x"})
+            for post in (self.post, self.post, self.other)
+        )
+        self.client.post(
+            "/app/bulkCreateComments", body, content_type="application/x-ndjson"
+        )
+        self.assertEqual(self.counts(self.post), (2, 2))
+        self.assertEqual(self.counts(self.other), (1, 1))
+
+        self.client.force_login(self.admin)
+        self.client.post(
+            "/app/bulkHideComments", json.dumps({"author": "serf"}),
+            content_type="application/json",
+        )
+        self.assertEqual(self.counts(self.post), (2, 0))
+        self.assertEqual(self.counts(self.other), (1, 0))
+
+    def test_recount_repairs_drift_in_one_query(self):
+        make_posts(self.user, 3, comments_per_post=2)
+        Comment.objects.create(author=self.user, post=self.other, content="y")
+        Comment.objects.create(author=self.user, post=self.other, content="z")
+        Comment.objects.filter(post=self.other, content="y").update(is_hidden=True)
+        Post.objects.update(
+            comment_count=99, visible_comment_count=99, last_comment_at=None
+        )
+
+        with CaptureQueriesContext(connection) as ctx:
+            call_command("recount", stdout=StringIO())
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        self.assertEqual(self.counts(self.post), (0, 0))
+        self.assertIsNone(self.post.last_comment_at)
+        self.assertEqual(self.counts(self.other), (2, 1))
+        for post in Post.objects.exclude(id__in=[self.post.id, self.other.id]):
+            self.assertEqual(self.counts(post), (2, 2))
+            latest = post.comment_set.latest("created_at")
+            self.assertEqual(post.last_comment_at, latest.created_at)
+
+    def test_feed_shows_visible_comment_count(self):
+        Comment.objects.create(author=self.user, post=self.post, content="a")
+        Comment.objects.create(
+            author=self.user, post=self.post, content="b", is_hidden=True
+        )
+        posts = {p["id"]: p for p in self.client.get("/app/feed").json()["posts"]}
+        self.assertEqual(posts[self.post.id]["comment_count"], 1)
+        self.assertEqual(posts[self.other.id]["comment_count"], 0)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("serf")
+        self.other = User.objects.create_user("other")
+        self.admin = User.objects.create_user("boss", is_staff=True)
+        self.client.force_login(self.user)
+        self.weather = Post.objects.create(
+            author=self.other, title="Bad weather", content="Storms over the lake"
+        )
+        self.gear = Post.objects.create(
+            author=self.other, title="Flight", content="landing gear failure, weather bad"
+        )
+        self.hidden = Post.objects.create(
+            author=self.other, title="Secret weather", content="x", is_hidden=True
+        )
+        self.comment = Comment.objects.create(
+            author=self.other, post=self.gear, content="the gear looked fine"
+        )
+
+    def search(self, q):
+        response = self.client.get("/app/search", {"q": q})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_phrase_query_and_ranking(self):
+        self.assertEqual(
+            [p["id"] for p in self.search('"bad weather"')["posts"]], [self.weather.id]
+        )
+        # both match the words; the title hit ranks first
+        self.assertEqual(
+            [p["id"] for p in self.search("bad weather")["posts"]],
+            [self.weather.id, self.gear.id],
+        )
+        self.assertIn("[landing gear]", self.search('"landing gear"')["posts"][0]["snippet"])
+
+    def test_visibility(self):
+        self.assertNotIn(self.hidden.id, [p["id"] for p in self.search("secret")["posts"]])
+        self.client.force_login(self.admin)
+        self.assertEqual([p["id"] for p in self.search("secret")["posts"]], [self.hidden.id])
+
+        Comment.objects.filter(id=self.comment.id).update(is_hidden=True)
+        self.client.force_login(self.user)
+        self.assertEqual(self.search("fine")["comments"], [])
+        self.client.force_login(self.other)
+        self.assertEqual(len(self.search("fine")["comments"]), 1)
+
+    def test_index_follows_bulk_writes(self):
+        Post.objects.bulk_create([Post(author=self.user, title="kayak", content="paddle")])
+        self.assertEqual(len(self.search("kayak")["posts"]), 1)
+        Post.objects.filter(title="kayak").update(content="canoe")
+        self.assertEqual(self.search("paddle")["posts"], [])
+        self.assertEqual(len(self.search("canoe")["posts"]), 1)
+        Post.objects.filter(title="kayak").delete()
+        self.assertEqual(self.search("canoe")["posts"], [])
+
+    def test_migrate_restores_dropped_triggers(self):
+        # what Django's table rebuild does to the triggers of app_post
+        with connection.cursor() as cursor:
+            for suffix in ("ai", "ad", "au"):
+                cursor.execute(f"DROP TRIGGER app_post_fts_{suffix}")
+        emit_post_migrate_signal(verbosity=0, interactive=False, db="default")
+
+        Post.objects.create(author=self.user, title="kayak", content="paddle")
+        self.assertEqual(len(self.search("kayak")["posts"]), 1)
+
+    def test_query_syntax_is_never_an_error(self):
+        self.assertEqual(self.search('AND OR ( "unclosed * NEAR')["posts"], [])
+        self.assertEqual(self.client.get("/app/search", {"q": " "}).status_code, 400)
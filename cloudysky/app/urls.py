@@ -6,6 +6,9 @@ urlpatterns = [
     path("", views.index, name="app_index"),
     path("index.html", views.index, name="app_index_html"),
 
+    # readiness probe
+    path("health", views.health),
+
     # HW4 user creation
     path("new/", views.new_user_form),
     path("createUser/", views.create_user),  # autograder uses this
@@ -17,12 +20,18 @@ urlpatterns = [
     # HW5 API endpoints
     path("createPost/", views.create_post),
     path("createComment/", views.create_comment),
+    path("bulkCreatePosts", views.bulk_create_posts),
+    path("bulkCreateComments", views.bulk_create_comments),
     path("hidePost/", views.hide_post),
     path("hideComment/", views.hide_comment),
+    path("bulkHidePosts", views.bulk_hide_posts),
+    path("bulkHideComments", views.bulk_hide_comments),
     path("dumpFeed/", views.dump_feed),
 
     path("feed", views.feed),
+    path("feedCacheStats", views.feed_cache_stats),
     path("post/<int:post_id>", views.post_detail),
+    path("search", views.search_view),
 
 ]
 
@@ -0,0 +1,71 @@
+'''bench_comments.py measures /app/createComment/ throughput with the strict
+single-query path and with the old fallback path (COMMENT_POST_FALLBACK).
+
+Run it from the cloudysky directory:
+
+    python bench_comments.py --comments 2000
+
+Each mode is timed with valid post ids and with malformed ones. It builds a
+throwaway SQLite database file, so it never touches db.sqlite3.
+'''
+import argparse, logging, os, sys, tempfile, time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cloudysky.settings')
+
+import django
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment
+
+from app.models import Post
+
+#sets up logging, all logs go to the console
+root = logging.getLogger()
+root.setLevel(logging.INFO)
+root.addHandler(logging.StreamHandler(sys.stdout))
+#the invalid-id runs would otherwise log every 400/404
+logging.getLogger('django.request').setLevel(logging.ERROR)
+
+
+def run(client, post_ids, comments):
+    start = time.perf_counter()
+    for i in range(comments):
+        client.post('/app/createComment/', {
+            'post_id': post_ids[i % len(post_ids)],
+            'content': f'comment {i}',
+        })
+    return comments / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--comments', type=int, default=1000)
+    parser.add_argument('--posts', type=int, default=1000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    connection.settings_dict['TEST']['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        user = User.objects.create(username='bench')
+        Post.objects.bulk_create(
+            Post(author=user, title=f'p{i}', content='x') for i in range(args.posts)
+        )
+        valid = list(Post.objects.values_list('id', flat=True))
+        invalid = ['', 'abc', str(max(valid) + 1)]
+
+        client = Client()
+        client.force_login(user)
+        for fallback in (True, False):
+            label = 'fallback' if fallback else 'strict'
+            with override_settings(COMMENT_POST_FALLBACK=fallback):
+                logging.info('%-8s valid post ids:   %7.1f comments/s',
+                             label, run(client, valid, args.comments))
+                logging.info('%-8s invalid post ids: %7.1f requests/s',
+                             label, run(client, invalid, args.comments))
+    finally:
+        connection.creation.destroy_test_db(connection.settings_dict['NAME'], verbosity=0)
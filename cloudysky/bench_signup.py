@@ -0,0 +1,95 @@
+'''bench_signup.py fires concurrent signups at /app/createUser/ and reports
+latency percentiles and signups per second per core.
+
+Run it from the cloudysky directory:
+
+    python bench_signup.py --threads 8 --signups 400
+    python bench_signup.py --profile scrypt --cost 8192
+
+--profile/--cost select the password hasher and its work factor (see
+PASSWORD_HASH_PROFILE in settings.py). It builds a throwaway SQLite
+database file, so it never touches db.sqlite3.
+'''
+import argparse, logging, os, sys, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+
+COST_ENV = {
+    'pbkdf2': 'CLOUDYSKY_PBKDF2_ITERATIONS',
+    'scrypt': 'CLOUDYSKY_SCRYPT_WORK_FACTOR',
+    'argon2': 'CLOUDYSKY_ARGON2_TIME_COST',
+}
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--threads', type=int, default=8)
+parser.add_argument('--signups', type=int, default=200)
+parser.add_argument('--profile', choices=sorted(COST_ENV), default='pbkdf2')
+parser.add_argument('--cost', type=int, help='work factor for the chosen hasher')
+args = parser.parse_args()
+
+#settings read the hasher profile from the environment, so set it before setup
+os.environ['CLOUDYSKY_HASH_PROFILE'] = args.profile
+if args.cost:
+    os.environ[COST_ENV[args.profile]] = str(args.cost)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cloudysky.settings')
+
+import django
+django.setup()
+
+from django.conf import settings
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import setup_test_environment
+
+#sets up logging, all logs go to the console
+root = logging.getLogger()
+root.setLevel(logging.INFO)
+root.addHandler(logging.StreamHandler(sys.stdout))
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def signup(i):
+    client = Client()
+    start = time.perf_counter()
+    response = client.post('/app/createUser/', {
+        'email': f'user{i}@example.com',
+        'user_name': f'user{i}',
+        'password': f'pw-{i}',
+    })
+    elapsed = time.perf_counter() - start
+    connections.close_all()
+    return elapsed, response.status_code
+
+
+def run(threads, signups):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(signup, range(signups)))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(elapsed for elapsed, _ in results)
+    failures = sum(1 for _, status in results if status != 200)
+
+    cores = min(threads, os.cpu_count() or 1)
+    logging.info('signups: %d on %d threads, %d failed', signups, threads, failures)
+    logging.info('throughput: %.1f signups/s (%.1f per core, %d cores)',
+                 signups / wall, signups / wall / cores, cores)
+    for pct in (50, 95, 99):
+        logging.info('p%d latency: %.1f ms', pct, percentile(latencies, pct) * 1000)
+    logging.info('max latency: %.1f ms', latencies[-1] * 1000)
+    return latencies
+
+
+if __name__ == '__main__':
+    logging.info('hasher: %s', settings.PASSWORD_HASHERS[0])
+    workdir = tempfile.mkdtemp()
+    connection.settings_dict['TEST']['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        run(args.threads, args.signups)
+    finally:
+        connection.creation.destroy_test_db(connection.settings_dict['NAME'], verbosity=0)
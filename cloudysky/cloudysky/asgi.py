@@ -2,3 +2,7 @@ import os
 from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cloudysky.settings')
 application = get_asgi_application()
+
+# schema work happens here, once per process, never inside a request
+from app.readiness import startup
+startup()
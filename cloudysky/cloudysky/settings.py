@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -56,6 +57,58 @@ DATABASES = {
     }
 }
 
+# Rendered feed pages are cached per viewer (see app/feed_cache.py).
+# Swap the "feed" backend for Redis/Memcached to share it between workers.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'feed': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'cloudysky-feed',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+FEED_CACHE_ALIAS = 'feed'
+FEED_CACHE_TIMEOUT = 300
+
+# createComment rejects a missing/unknown post_id (400/404). Set to True for
+# the old behaviour of attaching such comments to the first post instead.
+COMMENT_POST_FALLBACK = False
+
+# Rows per INSERT for /app/bulkCreatePosts and /app/bulkCreateComments
+BULK_BATCH_SIZE = 500
+
+# Migrations are applied once when a server process starts (app/readiness.py);
+# set to False where deploys run `manage.py ensure_schema` themselves.
+MIGRATE_ON_STARTUP = True
+SCHEMA_LOCK_FILE = BASE_DIR / 'db.sqlite3.lock'
+
+# Password hashing profile: 'pbkdf2' (Django's default), 'scrypt' or 'argon2'
+# (needs argon2-cffi). The other hashers stay listed so existing hashes keep
+# verifying. Costs of None mean Django's defaults; lower them for load tests.
+PASSWORD_HASH_PROFILE = os.environ.get('CLOUDYSKY_HASH_PROFILE', 'pbkdf2')
+_PASSWORD_HASHER_PROFILES = {
+    'pbkdf2': 'app.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'app.hashers.ScryptPasswordHasher',
+    'argon2': 'app.hashers.Argon2PasswordHasher',
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHER_PROFILES[PASSWORD_HASH_PROFILE]] + [
+    hasher for profile, hasher in _PASSWORD_HASHER_PROFILES.items()
+    if profile != PASSWORD_HASH_PROFILE
+]
+
+
+def _cost(name):
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+PASSWORD_PBKDF2_ITERATIONS = _cost('CLOUDYSKY_PBKDF2_ITERATIONS')
+PASSWORD_SCRYPT_WORK_FACTOR = _cost('CLOUDYSKY_SCRYPT_WORK_FACTOR')
+PASSWORD_ARGON2_TIME_COST = _cost('CLOUDYSKY_ARGON2_TIME_COST')
+PASSWORD_ARGON2_MEMORY_COST = _cost('CLOUDYSKY_ARGON2_MEMORY_COST')
+
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 
@@ -0,0 +1,58 @@
+'''bench_parallel.py measures build_index_tweets_1word_parallel on a synthetic
+corpus as the number of worker processes grows.
+
+    python bench_parallel.py --rows 10000000 --workers 1 2 4 8
+
+The corpus reuses the words of Tweets.csv with their real frequencies and
+tweet lengths, so the index has the same shape as the real one, just bigger.
+At 10M rows the index alone needs several GB of memory.
+'''
+import argparse, logging, sys, time
+import numpy as np
+import pandas as pd
+
+from keyword_search import load_tweets, build_index_tweets_1word_vectorized, build_index_tweets_1word_parallel
+
+#sets up logging, all logs go to the console
+root = logging.getLogger()
+root.setLevel(logging.WARNING)
+root.addHandler(logging.StreamHandler(sys.stdout))
+
+
+def synthetic_tweets(rows, seed=0):
+    '''a dataframe with a text column of rows random tweets drawn from Tweets.csv's vocabulary
+    '''
+    df = load_tweets('Tweets.csv')
+    words = df['text'].str.lower().str.split()
+
+    vocabulary, counts = np.unique(np.concatenate(words.to_numpy()), return_counts=True)
+    lengths = words.str.len().to_numpy()
+
+    rng = np.random.default_rng(seed)
+    sizes = rng.choice(lengths, size=rows)
+    tokens = rng.choice(vocabulary, size=sizes.sum(), p=counts / counts.sum())
+    ends = np.cumsum(sizes)
+    text = [' '.join(tokens[end - size:end]) for end, size in zip(ends, sizes)]
+    return pd.DataFrame({'text': text})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    data = synthetic_tweets(args.rows)
+    logging.warning('generated %d rows in %.1fs', len(data), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    build_index_tweets_1word_vectorized(data)
+    serial = time.perf_counter() - start
+    logging.warning('serial (vectorized)  %7.2fs', serial)
+
+    for workers in args.workers:
+        start = time.perf_counter()
+        build_index_tweets_1word_parallel(data, workers=workers)
+        elapsed = time.perf_counter() - start
+        logging.warning('%2d workers           %7.2fs  speedup %.2fx', workers, elapsed, serial / elapsed)
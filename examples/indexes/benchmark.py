@@ -0,0 +1,100 @@
+'''benchmark.py compares the dictionary index in keyword_search.py with the
+compressed InvertedIndex in inverted_index.py on the Tweets dataset.
+
+    python benchmark.py
+
+It checks that both return the same rows and logs build time, size and
+query time for single words, multi-word queries and exact phrases.
+'''
+import logging, sys, time
+
+from keyword_search import (load_tweets, build_index_tweets_1word,
+                            naive_find_tweets_1word, index_find_tweets_phrase_v2)
+from inverted_index import InvertedIndex, PositionalIndex
+
+#sets up logging, all logs go to the console
+root = logging.getLogger()
+root.setLevel(logging.INFO)
+root.addHandler(logging.StreamHandler(sys.stdout))
+
+WORDS = ['landing', 'lax', 'pilot', 'flight']
+QUERIES = ['bad weather', 'landing gear failure', 'the flight was late', 'thank you for the help']
+REPEAT = 200
+
+
+def timed(function, *args):
+    '''average seconds per call over REPEAT calls, and the last result
+    '''
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        result = function(*args)
+    return (time.perf_counter() - start) / REPEAT, result
+
+
+def dict_index_size(index):
+    '''bytes held by the python lists of the dictionary index (the int objects
+    are shared between lists, so they are not counted)
+    '''
+    return sum(sys.getsizeof(rows) for rows in index.values())
+
+
+def dict_find_all(index, words):
+    '''the candidate step of index_find_tweets_phrase_v2 without the text re-scan
+    '''
+    candidates = set(index[words[0]])
+    for word in words[1:]:
+        candidates = candidates.intersection(set(index[word]))
+    return candidates
+
+
+if __name__ == '__main__':
+    df = load_tweets('Tweets.csv')
+    texts = df['text'].tolist()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    start = time.perf_counter()
+    index = build_index_tweets_1word(df)
+    dict_build = time.perf_counter() - start
+    start = time.perf_counter()
+    inverted = InvertedIndex.build(texts)
+    inverted_build = time.perf_counter() - start
+    logging.getLogger().setLevel(logging.INFO)
+
+    logging.info('build: dict %.3fs, InvertedIndex %.3fs', dict_build, inverted_build)
+    logging.info('size:  dict %d bytes, InvertedIndex %d bytes',
+                 dict_index_size(index), inverted.nbytes())
+
+    logging.getLogger().setLevel(logging.WARNING)
+    for word in WORDS:
+        naive = set(naive_find_tweets_1word(df, word).index)
+        assert naive == set(inverted.find(word)), word
+        dict_time, _ = timed(lambda: list(index[word]))
+        inverted_time, _ = timed(inverted.find, word)
+        logging.warning('%-24s %5d rows  dict %.1fus  InvertedIndex %.1fus',
+                        word, len(naive), dict_time * 1e6, inverted_time * 1e6)
+
+    for query in QUERIES:
+        words = query.split()
+        expected = dict_find_all(index, words)
+        assert expected == set(inverted.find_all(words)), query
+        v2_start = time.perf_counter()
+        index_find_tweets_phrase_v2(df, index, query)
+        v2_time = time.perf_counter() - v2_start
+        dict_time, _ = timed(dict_find_all, index, words)
+        inverted_time, _ = timed(inverted.find_all, words)
+        logging.warning('%-24s %5d rows  phrase_v2 %.1fus  set intersection %.1fus  InvertedIndex %.1fus',
+                        query, len(expected), v2_time * 1e6, dict_time * 1e6, inverted_time * 1e6)
+
+    logging.getLogger().setLevel(logging.WARNING)
+    start = time.perf_counter()
+    positional = PositionalIndex.build(texts)
+    logging.warning('PositionalIndex build %.3fs, %d bytes',
+                    time.perf_counter() - start, positional.nbytes())
+
+    for query in QUERIES:
+        expected = set(index_find_tweets_phrase_v2(df, index, query).index)
+        candidates = len(positional.find_all(query.split()))
+        phrase_time, found = timed(positional.find_phrase, query)
+        assert set(found) == expected, query
+        logging.warning('%-24s %5d candidates %5d matches  PositionalIndex.find_phrase %.1fus',
+                        query, candidates, len(found), phrase_time * 1e6)
@@ -0,0 +1,610 @@
+'''inverted_index.py is a reusable version of the dictionary index in keyword_search.py.
+
+The dictionary index keeps a python list of ints per word, which costs ~8 bytes
+per entry plus a 28 byte int object per row id. Here every posting list is
+stored compressed:
+
+ * row ids are sorted, so we store the gaps between them (delta encoding),
+ * each gap is written as a varint: 7 bits per byte, high bit = "more bytes",
+   so most gaps take 1 byte instead of 8,
+ * every BLOCK ids we start a new block and remember its first id and byte
+   offset in uncompressed arrays. These "skip pointers" let a search jump
+   straight to the block that could hold an id without decoding the rest.
+
+Multi-word queries intersect posting lists starting from the rarest word and
+gallop (1, 2, 4, 8... blocks at a time) through the longer lists, so the cost
+depends on the rarest word, not the most common one.
+
+save() writes an index to a single file: a JSON term dictionary followed by
+one contiguous blob of posting buffers. load() memory-maps that file, so
+posting lists are read straight from the page cache when queried and a new
+process can answer queries without re-reading or re-indexing the CSV.
+
+RankedIndex also keeps term frequencies and row lengths and returns the top k
+rows by BM25. It uses MaxScore: once k rows are in the heap, words whose best
+possible contribution cannot lift a row past the k-th score are only looked
+up for rows that the other words already found, so most postings are skipped.
+'''
+import bisect, heapq, json, logging, math, mmap, os, struct, time
+from array import array
+from collections import Counter
+from itertools import accumulate
+
+BLOCK = 128
+MAGIC = b'INVIDX02'
+
+
+def encode_varint(value, out):
+    '''appends value to the byte array out, 7 bits at a time
+    '''
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varints(data, start, end):
+    '''decodes every varint in data[start:end]
+    '''
+    values = []
+    value = shift = 0
+    for i in range(start, end):
+        byte = data[i]
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+    return values
+
+
+class PostingList:
+    '''Sorted row ids for one word, delta + varint compressed in blocks.
+
+    data holds the varint gaps, heads the first id of every block and offsets
+    where each block starts in data. They are array buffers while building and
+    can be any buffer (e.g. a memoryview) afterwards.
+    '''
+
+    __slots__ = ('data', 'heads', 'offsets', 'length', 'last')
+
+    #buffers and plain values written by InvertedIndex.save, with their array typecodes
+    FIELDS = (('data', 'B'), ('heads', 'q'), ('offsets', 'Q'))
+    SCALARS = ()
+
+    def __init__(self, data=None, heads=None, offsets=None, length=0):
+        self.data = array('B') if data is None else data
+        self.heads = array('q') if heads is None else heads
+        self.offsets = array('Q') if offsets is None else offsets
+        self.length = length
+        self.last = None
+
+    def append(self, row_id):
+        '''row ids must be appended in increasing order
+        '''
+        if self.length % BLOCK == 0:
+            self.heads.append(row_id)
+            self.offsets.append(len(self.data))
+        else:
+            encode_varint(row_id - self.last, self.data)
+        self.last = row_id
+        self.length += 1
+
+    def __len__(self):
+        return self.length
+
+    def nbytes(self):
+        return len(self.data) + 8 * len(self.heads) + 8 * len(self.offsets)
+
+    def block(self, b):
+        '''decodes block number b back into row ids
+        '''
+        start = self.offsets[b]
+        end = self.offsets[b + 1] if b + 1 < len(self.offsets) else len(self.data)
+        gaps = self.data[start:end]
+        #common case: every gap fits in one byte, so the bytes are the gaps
+        if not gaps or max(gaps) < 0x80:
+            return list(accumulate(gaps, initial=self.heads[b]))
+        return list(accumulate(decode_varints(gaps, 0, len(gaps)), initial=self.heads[b]))
+
+    def __iter__(self):
+        for b in range(len(self.heads)):
+            yield from self.block(b)
+
+    def cursor(self):
+        return PostingCursor(self)
+
+
+class PostingCursor:
+    '''Walks a posting list forward, skipping whole blocks when it can.
+    '''
+
+    def __init__(self, postings):
+        self.postings = postings
+        self.b = 0
+        self.ids = postings.block(0) if len(postings) else []
+        self.pos = 0
+
+    def next_geq(self, target):
+        '''returns the first row id >= target (or None), never moving backwards
+        '''
+        heads = self.postings.heads
+        nblocks = len(heads)
+        if not self.ids:
+            return None
+
+        #gallop over the block heads: 1, 2, 4... blocks ahead
+        if self.b + 1 < nblocks and heads[self.b + 1] <= target:
+            lo, step = self.b + 1, 1
+            while lo + step < nblocks and heads[lo + step] <= target:
+                lo += step
+                step *= 2
+            hi = min(lo + step, nblocks)
+            b = bisect.bisect_right(heads, target, lo, hi) - 1
+            self.b, self.ids, self.pos = b, self.postings.block(b), 0
+
+        #binary search inside the decoded block
+        self.pos = bisect.bisect_left(self.ids, target, self.pos)
+        if self.pos < len(self.ids):
+            return self.ids[self.pos]
+
+        #target is past this block: the answer is the next block's head
+        if self.b + 1 < nblocks:
+            self.b += 1
+            self.ids, self.pos = self.postings.block(self.b), 0
+            return self.ids[0]
+        return None
+
+    def ordinal(self):
+        '''how many ids come before the current one in the whole list
+        '''
+        return self.b * BLOCK + self.pos
+
+
+def intersect(posting_lists):
+    '''row ids present in every posting list, rarest list first
+    '''
+    if not posting_lists:
+        return []
+    posting_lists = sorted(posting_lists, key=len)
+    result = list(posting_lists[0])
+    for postings in posting_lists[1:]:
+        cursor = postings.cursor()
+        kept = []
+        for row_id in result:
+            found = cursor.next_geq(row_id)
+            if found is None:
+                break
+            if found == row_id:
+                kept.append(row_id)
+        result = kept
+        if not result:
+            break
+    return result
+
+
+def tokenize(text):
+    '''same normalisation as keyword_search.py: lowercase, split on whitespace
+    '''
+    return text.lower().split()
+
+
+def write_buffer(blob, buffer):
+    '''appends buffer to blob and returns where it went
+    '''
+    raw = bytes(buffer)
+    span = (len(blob), len(raw))
+    blob += raw
+    #keep every buffer 8 byte aligned so it can be cast in place
+    blob += bytes(-len(blob) % 8)
+    return span
+
+
+def read_buffer(mapped, span, typecode):
+    '''a view of a buffer written by write_buffer, without copying it
+    '''
+    start, size = span
+    view = mapped[start:start + size]
+    return view if typecode == 'B' else view.cast(typecode)
+
+
+def source_stamp(file):
+    '''size and modification time of the file an index was built from
+    '''
+    stat = os.stat(file)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+class MappedTerms(dict):
+    '''Term dictionary of a loaded index. Values start as (length, spans, scalars) entries
+    and become PostingLists over slices of the mapped file the first time a
+    word is looked up, so loading does not touch the postings at all.
+    '''
+
+    def __init__(self, entries, buffer, postings_class):
+        super().__init__(entries)
+        self.buffer = buffer
+        self.postings_class = postings_class
+
+    def __getitem__(self, word):
+        value = super().__getitem__(word)
+        if isinstance(value, PostingList):
+            return value
+        length, spans, scalars = value
+        buffers = {name: read_buffer(self.buffer, span, typecode)
+                   for (name, typecode), span in zip(self.postings_class.FIELDS, spans)}
+        postings = self.postings_class(length=length, **buffers)
+        for name, scalar in zip(self.postings_class.SCALARS, scalars):
+            setattr(postings, name, scalar)
+        self[word] = postings
+        return postings
+
+    def get(self, word, default=None):
+        return self[word] if word in self else default
+
+    def values(self):
+        return (self[word] for word in self)
+
+    def items(self):
+        return ((word, self[word]) for word in self)
+
+
+class InvertedIndex:
+    '''Maps every word to a compressed PostingList of the rows containing it.
+    '''
+
+    postings_class = PostingList
+
+    #index-wide buffers and values written by save(), like PostingList.FIELDS/SCALARS
+    FIELDS = ()
+    SCALARS = ('n_docs',)
+
+    def __init__(self):
+        self.terms = {}
+        self.n_docs = 0
+
+    def add(self, row_id, text):
+        '''indexes one row; rows must be added in increasing row_id order
+        '''
+        for word in dict.fromkeys(tokenize(text)):
+            postings = self.terms.get(word)
+            if postings is None:
+                postings = self.terms[word] = self.postings_class()
+            postings.append(row_id)
+        self.n_docs += 1
+
+    @classmethod
+    def build(cls, texts):
+        '''builds an index from the text column of a dataframe (or any list of strings)
+        '''
+        start = time.perf_counter()
+
+        index = cls()
+        for row_id, text in enumerate(texts):
+            index.add(row_id, text)
+
+        end = time.perf_counter()
+        logging.info('InvertedIndex.build took ' + str(end-start) + ' seconds')
+        logging.info('InvertedIndex.build found ' + str(len(index.terms)) + ' distinct words')
+        return index
+
+    def nbytes(self):
+        return sum(postings.nbytes() for postings in self.terms.values())
+
+    def save(self, file, source=None):
+        '''writes the index to file; source is the file it was built from, whose
+        size and mtime are recorded so load() can tell when the index is stale
+        '''
+        start = time.perf_counter()
+
+        blob = bytearray()
+        fields = [write_buffer(blob, getattr(self, name)) for name, _ in self.FIELDS]
+
+        entries = {}
+        for word, postings in self.terms.items():
+            spans = [write_buffer(blob, getattr(postings, name)) for name, _ in self.postings_class.FIELDS]
+            scalars = [getattr(postings, name) for name in self.postings_class.SCALARS]
+            entries[word] = (len(postings), spans, scalars)
+
+        meta = json.dumps({
+            'kind': type(self).__name__,
+            'source': source_stamp(source) if source else None,
+            'scalars': {name: getattr(self, name) for name in self.SCALARS},
+            'fields': fields,
+            'terms': entries,
+        }).encode()
+        meta += b' ' * (-(len(MAGIC) + 8 + len(meta)) % 8)
+
+        with open(file, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<Q', len(meta)))
+            f.write(meta)
+            f.write(blob)
+
+        end = time.perf_counter()
+        logging.info('InvertedIndex.save took ' + str(end-start) + ' seconds')
+
+    @classmethod
+    def load(cls, file, source=None):
+        '''memory-maps an index written by save(). Returns None if the file does
+        not exist or, when source is given, if source changed since the save.
+        A loaded index is read-only.
+        '''
+        start = time.perf_counter()
+
+        try:
+            f = open(file, 'rb')
+        except FileNotFoundError:
+            logging.info('InvertedIndex.load found no index at ' + str(file))
+            return None
+
+        with f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(str(file) + ' is not an index file')
+            (meta_size,) = struct.unpack('<Q', f.read(8))
+            meta = json.loads(f.read(meta_size))
+            if meta['kind'] != cls.__name__:
+                raise ValueError(str(file) + ' holds a ' + meta['kind'] + ', not a ' + cls.__name__)
+            if source is not None and meta['source'] != source_stamp(source):
+                logging.info('InvertedIndex.load: ' + str(file) + ' is stale, ' + str(source) + ' changed')
+                return None
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        blob = memoryview(mapped)[len(MAGIC) + 8 + meta_size:]
+        index = cls()
+        for name, value in meta['scalars'].items():
+            setattr(index, name, value)
+        for (name, typecode), span in zip(cls.FIELDS, meta['fields']):
+            setattr(index, name, read_buffer(blob, span, typecode))
+        index.terms = MappedTerms(meta['terms'], blob, cls.postings_class)
+
+        end = time.perf_counter()
+        logging.info('InvertedIndex.load took ' + str(end-start) + ' seconds')
+        return index
+
+    def postings(self, word):
+        return self.terms.get(word.lower())
+
+    def find(self, word):
+        '''row ids of every row containing word
+        '''
+        postings = self.postings(word)
+        return list(postings) if postings is not None else []
+
+    def find_all(self, words):
+        '''row ids of every row containing all of the words
+        '''
+        posting_lists = [self.postings(word) for word in tokenize(' '.join(words))]
+        if not posting_lists or any(p is None for p in posting_lists):
+            return []
+        return intersect(posting_lists)
+
+
+class PositionalPostingList(PostingList):
+    '''A PostingList that also keeps where the word appears in each row.
+
+    For the n-th row id, positions[offsets[n]:] holds the number of positions
+    followed by the delta encoded positions, all as varints.
+    '''
+
+    __slots__ = ('positions', 'position_offsets')
+
+    FIELDS = PostingList.FIELDS + (('positions', 'B'), ('position_offsets', 'Q'))
+
+    def __init__(self, *args, positions=None, position_offsets=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.positions = array('B') if positions is None else positions
+        self.position_offsets = array('Q') if position_offsets is None else position_offsets
+
+    def append_positions(self, row_id, positions):
+        self.append(row_id)
+        self.position_offsets.append(len(self.positions))
+        encode_varint(len(positions), self.positions)
+        previous = 0
+        for position in positions:
+            encode_varint(position - previous, self.positions)
+            previous = position
+
+    def nbytes(self):
+        return super().nbytes() + len(self.positions) + 8 * len(self.position_offsets)
+
+    def positions_at(self, n):
+        '''word positions for the n-th row id of this list
+        '''
+        start = self.position_offsets[n]
+        end = self.position_offsets[n + 1] if n + 1 < len(self.position_offsets) else len(self.positions)
+        values = decode_varints(self.positions, start, end)
+        return list(accumulate(values[1:]))
+
+
+class PositionalIndex(InvertedIndex):
+    '''InvertedIndex that can answer exact phrase queries from the index alone.
+
+    A row matches a phrase when word k of the phrase sits at position p + k for
+    some p, so rows are first narrowed with the usual intersection and then
+    the position lists of the survivors are merged; the text is never read.
+    '''
+
+    postings_class = PositionalPostingList
+
+    def add(self, row_id, text):
+        positions = {}
+        for position, word in enumerate(tokenize(text)):
+            positions.setdefault(word, []).append(position)
+        for word, where in positions.items():
+            postings = self.terms.get(word)
+            if postings is None:
+                postings = self.terms[word] = self.postings_class()
+            postings.append_positions(row_id, where)
+        self.n_docs += 1
+
+    def find_phrase(self, phrase):
+        '''row ids of every row containing the words of phrase next to each other, in order
+        '''
+        start = time.perf_counter()
+
+        words = tokenize(phrase)
+        posting_lists = [self.postings(word) for word in words]
+        if not words or any(p is None for p in posting_lists):
+            return []
+
+        candidates = intersect(posting_lists)
+        logging.info('PositionalIndex.find_phrase considering ' + str(len(candidates)) + ' candidates')
+
+        result = []
+        if len(words) == 1:
+            result = candidates
+        else:
+            cursors = [postings.cursor() for postings in posting_lists]
+            for row_id in candidates:
+                starts = None
+                for k, (postings, cursor) in enumerate(zip(posting_lists, cursors)):
+                    cursor.next_geq(row_id)
+                    shifted = {p - k for p in postings.positions_at(cursor.ordinal())}
+                    starts = shifted if starts is None else starts & shifted
+                    if not starts:
+                        break
+                if starts:
+                    result.append(row_id)
+
+        end = time.perf_counter()
+        logging.info('PositionalIndex.find_phrase took ' + str(end-start) + ' seconds')
+        logging.info('PositionalIndex.find_phrase found ' + str(len(result)) + ' tweets')
+        return result
+
+
+class ScoredPostingList(PostingList):
+    '''A PostingList that also keeps how often the word appears in each row
+    (tfs, aligned with the row ids), plus the largest count and the shortest
+    row in the list, which bound the best BM25 score the word can give.
+    '''
+
+    __slots__ = ('tfs', 'max_tf', 'min_length')
+
+    FIELDS = PostingList.FIELDS + (('tfs', 'H'),)
+    SCALARS = ('max_tf', 'min_length')
+
+    def __init__(self, *args, tfs=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tfs = array('H') if tfs is None else tfs
+        self.max_tf = 0
+        self.min_length = None
+
+    def append_scored(self, row_id, tf, length):
+        self.append(row_id)
+        self.tfs.append(min(tf, 0xFFFF))
+        self.max_tf = max(self.max_tf, tf)
+        self.min_length = length if self.min_length is None else min(self.min_length, length)
+
+    def nbytes(self):
+        return super().nbytes() + 2 * len(self.tfs)
+
+
+class RankedIndex(InvertedIndex):
+    '''InvertedIndex that ranks rows by BM25 and returns only the best k.
+    '''
+
+    postings_class = ScoredPostingList
+
+    FIELDS = (('lengths', 'I'),)
+    SCALARS = ('n_docs', 'total_length')
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        super().__init__()
+        self.lengths = array('I')
+        self.total_length = 0
+
+    def add(self, row_id, text):
+        words = tokenize(text)
+        for word, tf in Counter(words).items():
+            postings = self.terms.get(word)
+            if postings is None:
+                postings = self.terms[word] = self.postings_class()
+            postings.append_scored(row_id, tf, len(words))
+
+        #lengths is indexed by row id, rows that were never added have length 0
+        self.lengths.extend([0] * (row_id - len(self.lengths)))
+        self.lengths.append(len(words))
+        self.total_length += len(words)
+        self.n_docs += 1
+
+    def idf(self, postings):
+        return math.log(1 + (self.n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+
+    def bm25(self, idf, tf, length, average):
+        return idf * tf * (self.K1 + 1) / (tf + self.K1 * (1 - self.B + self.B * length / average))
+
+    def top_k(self, query, k=10):
+        '''the k best (row id, score) pairs for query, best first. Ties go to the lower row id.
+        '''
+        start = time.perf_counter()
+
+        words = [word for word in dict.fromkeys(tokenize(query)) if word in self.terms]
+        if not words or k < 1:
+            return []
+        average = self.total_length / self.n_docs
+
+        #each word with its idf and an upper bound on what it can add to a score
+        terms = []
+        for word in words:
+            postings = self.terms[word]
+            idf = self.idf(postings)
+            bound = self.bm25(idf, postings.max_tf, postings.min_length, average)
+            terms.append((bound, idf, postings))
+        terms.sort(key=lambda term: term[0])
+        bounds = list(accumulate(term[0] for term in terms))
+
+        cursors = [postings.cursor() for _, _, postings in terms]
+        current = [cursor.next_geq(0) for cursor in cursors]
+
+        def score(i, row_id):
+            _, idf, postings = terms[i]
+            tf = postings.tfs[cursors[i].ordinal()]
+            return self.bm25(idf, tf, self.lengths[row_id], average)
+
+        heap = []
+        threshold = 0.0
+        essential = 0
+        scored = 0
+        while True:
+            #words 0..essential-1 together cannot beat the threshold, so only the
+            #others can bring in new rows
+            while essential < len(terms) and bounds[essential] <= threshold:
+                essential += 1
+            candidates = [row_id for row_id in current[essential:] if row_id is not None]
+            if not candidates:
+                break
+            row_id = min(candidates)
+            scored += 1
+
+            total = 0.0
+            for i in range(essential, len(terms)):
+                if current[i] == row_id:
+                    total += score(i, row_id)
+                    current[i] = cursors[i].next_geq(row_id + 1)
+
+            #then the non-essential words, biggest first, while the row can still make it
+            for i in reversed(range(essential)):
+                if total + bounds[i] <= threshold:
+                    break
+                current[i] = cursors[i].next_geq(row_id)
+                if current[i] == row_id:
+                    total += score(i, row_id)
+
+            if len(heap) < k:
+                heapq.heappush(heap, (total, -row_id))
+            elif total > threshold:
+                heapq.heapreplace(heap, (total, -row_id))
+            if len(heap) == k:
+                threshold = heap[0][0]
+
+        result = [(-neg_row_id, total) for total, neg_row_id in sorted(heap, reverse=True)]
+
+        end = time.perf_counter()
+        logging.info('RankedIndex.top_k took ' + str(end-start) + ' seconds')
+        logging.info('RankedIndex.top_k scored ' + str(scored) + ' rows for ' + str(sum(len(t[2]) for t in terms)) + ' postings')
+        return result
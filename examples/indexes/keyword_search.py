@@ -2,19 +2,72 @@
 '''
 
 #Some imports
-import time, logging, sys
+import time, logging, os, sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 
-'''This code sets up logging and display for class
-'''
-root = logging.getLogger()
-root.setLevel(logging.DEBUG)
-handler = logging.StreamHandler(open('out.log', 'w'))
-handler.setLevel(logging.DEBUG)
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
-root.addHandler(handler)
-pd.set_option('display.max_colwidth', 500)
+from inverted_index import InvertedIndex
+
+try:
+    import resource
+except ImportError: #Windows has no resource module; peak_memory_mb() is then unavailable
+    resource = None
+
+def setup_logging(file='out.log'):
+    '''This code sets up logging and display for class
+    '''
+    root = logging.getLogger()
+    root.setLevel(logging.DEBUG)
+    handler = logging.StreamHandler(open(file, 'w'))
+    handler.setLevel(logging.DEBUG)
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handler.setFormatter(formatter)
+    root.addHandler(handler)
+    pd.set_option('display.max_colwidth', 500)
+
+
+class QueryCache:
+    '''A bounded LRU cache of query -> result row ids. Building a new index
+    clears it, since the row ids it holds may no longer be right.
+    '''
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query):
+        if query in self.results:
+            self.hits += 1
+            self.results.move_to_end(query)
+            return self.results[query]
+        self.misses += 1
+        return None
+
+    def put(self, query, rows):
+        self.results[query] = rows
+        self.results.move_to_end(query)
+        if len(self.results) > self.maxsize:
+            self.results.popitem(last=False)
+
+    def clear(self):
+        self.results.clear()
+
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+query_cache = QueryCache()
+
+
+def normalize_query(phrase):
+    '''lowercase and single spaces, so "Bad  Weather" and "bad weather" share a cache entry
+    '''
+    return ' '.join(phrase.lower().split())
 
 
 def load_tweets(file):
@@ -29,12 +82,75 @@ def load_tweets(file):
     logging.info('Load_Tweets took ' + str(end-start) + ' seconds')
     logging.info('Load_Tweets found ' + str(len(df)) + ' Tweets')
 
-    #clean up the text strip all punctuation
-    df['text'] = df['text'].str.replace('[^\w\s]',' ')
+    df['text'] = clean_text(df['text'])
 
     return df
 
 
+def clean_text(text):
+    '''clean up the text strip all punctuation
+    '''
+    return text.str.replace(r'[^\w\s]', ' ', regex=True)
+
+
+def peak_memory_mb():
+    '''the most memory this process has held at any point so far (its high-water mark),
+    or None where the resource module is missing (Windows)
+    '''
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def iter_tweet_chunks(file, chunksize=10000):
+    '''load_tweets for big files: reads and cleans chunksize rows at a time, so
+    only one chunk of raw text is in memory at once. Row labels keep counting
+    across chunks, the same as in the dataframe load_tweets returns.
+    '''
+    for chunk in pd.read_csv(file, chunksize=chunksize):
+        chunk['text'] = clean_text(chunk['text'])
+        yield chunk
+
+
+def build_index_streaming(file, chunksize=10000, index=None):
+    '''indexes the tweets in file one chunk at a time into an InvertedIndex (or the
+    index passed in). It yields (chunk, index) after every chunk, so queries can
+    run on the rows read so far while the rest of the file is still loading.
+    '''
+    start = time.perf_counter()
+
+    index = InvertedIndex() if index is None else index
+
+    for chunk in iter_tweet_chunks(file, chunksize):
+        for row_id, text in zip(chunk.index.tolist(), chunk['text']):
+            index.add(row_id, text)
+
+        peak = peak_memory_mb()
+        logging.info('build_index_streaming indexed ' + str(index.n_docs) + ' tweets, peak memory '
+                     + (str(peak) + ' MB' if peak is not None else 'unavailable'))
+        yield chunk, index
+
+    end = time.perf_counter()
+    logging.info('build_index_streaming took ' + str(end-start) + ' seconds')
+    logging.info('build_index_streaming found ' + str(len(index.terms)) + ' distinct words')
+
+
+def load_or_build_index(file, index_file='Tweets.idx'):
+    '''opens the saved InvertedIndex for file, or builds and saves one if there is
+    none yet or file changed since it was saved
+    '''
+    index = InvertedIndex.load(index_file, source=file)
+
+    if index is None:
+        df = load_tweets(file)
+        index = InvertedIndex.build(df['text'])
+        index.save(index_file, source=file)
+
+    return index
+
+
 def naive_find_tweets_1word(data, keyword):
     '''Searches through the data to find all tweets that contain a single word. We'll make this interesting
     and make it case insensitive.
@@ -57,7 +173,7 @@ def naive_find_tweets_1word(data, keyword):
     logging.info('naive_find_tweets_1word took ' + str(end-start) + ' seconds')
     logging.info('naive_find_tweets_1word found ' + str(len(result)) + ' tweets')
 
-    return df.iloc[result,:]
+    return data.iloc[result,:]
 
 def build_index_tweets_1word(data):
     '''build index builds a dictionary data structure that we can re-use across the tweets 
@@ -79,6 +195,81 @@ def build_index_tweets_1word(data):
     logging.info('build_index_tweets_1word took ' + str(end-start) + ' seconds')
     logging.info('build_index_tweets_1word found ' + str(len(index)) + ' distinct words')
 
+    query_cache.clear()
+
+    return index
+
+
+def build_index_tweets_1word_vectorized(data):
+    '''builds the same dictionary as build_index_tweets_1word, but with pandas string
+    operations on the whole column instead of a python loop over iterrows()
+    '''
+    start = time.perf_counter()
+
+    #one row per (tweet, word), the index still says which tweet it came from
+    words = data['text'].str.lower().str.split().explode().dropna()
+
+    #give every distinct word an id (in order of first appearance), then sort the
+    #rows by word id; a stable sort keeps each word's tweets in order
+    codes, uniques = pd.factorize(words.to_numpy())
+    order = np.argsort(codes, kind='stable')
+    rows = words.index.to_numpy()[order]
+    ends = np.cumsum(np.bincount(codes, minlength=len(uniques)))
+
+    index = dict(zip(uniques, (part.tolist() for part in np.split(rows, ends[:-1]))))
+
+    end = time.perf_counter()
+    logging.info('build_index_tweets_1word_vectorized took ' + str(end-start) + ' seconds')
+    logging.info('build_index_tweets_1word_vectorized found ' + str(len(index)) + ' distinct words')
+
+    query_cache.clear()
+
+    return index
+
+
+def build_index_shard(text):
+    '''builds the index for one shard (a row range of the text column); runs in a worker process
+    '''
+    return build_index_tweets_1word_vectorized(text.to_frame())
+
+
+def merge_indexes(shards):
+    '''merges shard indexes in row order, so the result is the same as indexing all rows at once
+    '''
+    index = {}
+
+    for shard in shards:
+        for word, rows in shard.items():
+            if word in index:
+                index[word].extend(rows)
+            else:
+                index[word] = rows
+
+    return index
+
+
+def build_index_tweets_1word_parallel(data, workers=None, shards=None):
+    '''splits the tweets into row-range shards, indexes them in a process pool
+    and merges the results into one dictionary like build_index_tweets_1word's
+    '''
+    start = time.perf_counter()
+
+    workers = workers or os.cpu_count()
+    shards = shards or workers
+
+    bounds = np.linspace(0, len(data), shards + 1).astype(int)
+    parts = [data['text'].iloc[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        #map hands the shards back in submission order, i.e. in row order
+        index = merge_indexes(pool.map(build_index_shard, parts))
+
+    end = time.perf_counter()
+    logging.info('build_index_tweets_1word_parallel took ' + str(end-start) + ' seconds with ' + str(workers) + ' workers')
+    logging.info('build_index_tweets_1word_parallel found ' + str(len(index)) + ' distinct words')
+
+    query_cache.clear()
+
     return index
 
 
@@ -96,7 +287,7 @@ def index_find_tweets_1word(data, index, keyword):
     logging.info('index_find_tweets_1word took ' + str(end-start) + ' seconds')
     logging.info('index_find_tweets_1word found ' + str(len(result)) + ' tweets')
 
-    return df.iloc[result,:]
+    return data.iloc[result,:]
 
 
 def naive_find_tweets_phrase(data, phrase):
@@ -119,7 +310,7 @@ def naive_find_tweets_phrase(data, phrase):
     logging.info('naive_find_tweets_phrase took ' + str(end-start) + ' seconds')
     logging.info('naive_find_tweets_phrase found ' + str(len(result)) + ' tweets')
 
-    return df.iloc[result,:]
+    return data.iloc[result,:]
 
 
 def index_find_tweets_phrase_v1(data, index, phrase):
@@ -140,14 +331,14 @@ def index_find_tweets_phrase_v1(data, index, phrase):
 
     #filter the list of candidate tweets
     for candidate in candidates:
-        if phrase.lower() in df.iloc[candidate,10].lower():
+        if phrase.lower() in data.iloc[candidate,10].lower():
             result.append(candidate)
 
     end = time.perf_counter()
     logging.info('index_find_tweets_phrase_v1 took ' + str(end-start) + ' seconds')
     logging.info('index_find_tweets_phrase_v1 found ' + str(len(result)) + ' tweets')
 
-    return df.iloc[result,:]
+    return data.iloc[result,:]
 
 
 def index_find_tweets_phrase_v2(data, index, phrase):
@@ -172,15 +363,54 @@ def index_find_tweets_phrase_v2(data, index, phrase):
 
     #filter the list of candidate tweets
     for candidate in candidates:
-        if phrase.lower() in df.iloc[candidate,10].lower():
+        if phrase.lower() in data.iloc[candidate,10].lower():
             result.append(candidate)
 
     end = time.perf_counter()
     logging.info('index_find_tweets_phrase_v2 took ' + str(end-start) + ' seconds')
     logging.info('index_find_tweets_phrase_v2 found ' + str(len(result)) + ' tweets')
 
-    return df.iloc[result,:]
+    return data.iloc[result,:]
+
+
+def cached_find_tweets_phrase(data, index, phrase):
+    '''index_find_tweets_phrase_v2 with the result row ids kept in query_cache,
+    separately for every index and dataframe it is called with
+    '''
+    start = time.perf_counter()
+
+    query = normalize_query(phrase)
+    #the row ids belong to this index and dataframe, so they are part of the key
+    key = (id(index), id(data), query)
+    entry = query_cache.get(key)
+
+    if entry is None:
+        #the entry holds on to index and data, so their ids cannot be reused
+        #by other objects while it is cached
+        entry = (index, data, list(index_find_tweets_phrase_v2(data, index, query).index))
+        query_cache.put(key, entry)
+    result = entry[2]
+
+    end = time.perf_counter()
+    logging.info('cached_find_tweets_phrase took ' + str(end-start) + ' seconds')
+    logging.info('cached_find_tweets_phrase hit ratio ' + str(query_cache.hit_ratio()) + ' (' + str(query_cache.hits) + ' hits, ' + str(query_cache.misses) + ' misses)')
+
+    return data.loc[result,:]
+
+
+def ranked_find_tweets(data, index, query, k=10):
+    '''the k tweets that best match query according to a RankedIndex, best first,
+    with their BM25 score in a score column
+    '''
+    result = index.top_k(query, k)
+
+    rows = data.loc[[row_id for row_id, _ in result],:].copy()
+    rows['score'] = [score for _, score in result]
+    return rows
+
 
+if __name__ == '__main__':
+    setup_logging()
 
 '''keywords
 '''
@@ -218,7 +448,8 @@ print(naive_find_tweets_1word(df, 'pilot')['text'])
 #print(naive_find_tweets_phrase(df, 'landing gear failure')['text'])
 
 
-print('----')
+if __name__ == '__main__':
+    print('----')
 
 #v1
 #df = load_tweets('Tweets.csv')
@@ -228,8 +459,9 @@ print('----')
 
 
 #v2
-df = load_tweets('Tweets.csv')
-index = build_index_tweets_1word(df)
-print(index_find_tweets_phrase_v2(df, index, 'bad weather')['text'])
-print(index_find_tweets_phrase_v2(df, index, 'landing gear failure')['text'])
+if __name__ == '__main__':
+    df = load_tweets('Tweets.csv')
+    index = build_index_tweets_1word(df)
+    print(index_find_tweets_phrase_v2(df, index, 'bad weather')['text'])
+    print(index_find_tweets_phrase_v2(df, index, 'landing gear failure')['text'])
 
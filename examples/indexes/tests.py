@@ -0,0 +1,333 @@
+'''tests.py is a standalone script that checks inverted_index.py against the
+dictionary index in keyword_search.py.
+
+    python tests.py
+'''
+import sys, os, logging, shutil, tempfile, traceback
+from array import array
+
+#sets up logging, all logs go to the console
+root = logging.getLogger()
+root.setLevel(logging.INFO)
+root.addHandler(logging.StreamHandler(sys.stdout))
+
+
+'''Now we will import our code
+'''
+from keyword_search import (load_tweets, load_or_build_index, build_index_tweets_1word, build_index_tweets_1word_vectorized,
+                            build_index_tweets_1word_parallel, index_find_tweets_phrase_v2,
+                            QueryCache, query_cache, cached_find_tweets_phrase, build_index_streaming,
+                            ranked_find_tweets)
+from inverted_index import (BLOCK, PostingList, InvertedIndex, PositionalIndex, RankedIndex,
+                            encode_varint, decode_varints, intersect)
+
+#the data sits next to this file, wherever the tests are run from
+TWEETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Tweets.csv')
+
+
+def doTests():
+    tests = [
+        testVarintRoundTrip,
+        testPostingListBlocks,
+        testCursorNextGeq,
+        testIntersect,
+        testMatchesDictionaryIndex,
+        testVectorizedBuildMatches,
+        testParallelBuildMatches,
+        testQueryCacheEvictsLeastRecentlyUsed,
+        testCachedPhraseSearch,
+        testStreamingBuild,
+        testPositionalPhrases,
+        testPositionalMatchesPhraseV2,
+        testSaveAndLoad,
+        testStaleIndexIsRebuilt,
+        testRankedTopK,
+    ]
+
+    for number, function in enumerate(tests, start=1):
+        logging.info('Test ' + str(number) + '. Running ' + function.__name__ + '()')
+
+        try:
+            function()
+            logging.info('Test ' + str(number) + '. Passed')
+
+        except AssertionError:
+            logging.info('Test ' + str(number) + '. Failed with error ' + str(traceback.format_exc()))
+
+
+def testVarintRoundTrip():
+    values = [0, 1, 127, 128, 300, 16383, 16384, 2**40]
+    out = array('B')
+    for value in values:
+        encode_varint(value, out)
+
+    #small values take one byte, and decoding gives them all back
+    assert(len(out) < 8 * len(values))
+    assert(decode_varints(out, 0, len(out)) == values)
+
+
+def testPostingListBlocks():
+    ids = list(range(0, 5000, 3)) + [10**6, 10**7]
+    postings = PostingList()
+    for row_id in ids:
+        postings.append(row_id)
+
+    assert(len(postings) == len(ids))
+    assert(len(postings.heads) == (len(ids) + BLOCK - 1) // BLOCK)
+    assert(list(postings) == ids)
+
+
+def testCursorNextGeq():
+    ids = list(range(0, 100000, 7))
+    postings = PostingList()
+    for row_id in ids:
+        postings.append(row_id)
+
+    #forward jumps inside a block, across one block and across many
+    cursor = postings.cursor()
+    for target in [0, 1, 8, 900, 901, 50000, 99995, 99996]:
+        expected = next((i for i in ids if i >= target), None)
+        assert(cursor.next_geq(target) == expected)
+    assert(cursor.next_geq(100000) is None)
+
+
+def testIntersect():
+    lists = []
+    for step in (2, 3, 5):
+        postings = PostingList()
+        for row_id in range(0, 30000, step):
+            postings.append(row_id)
+        lists.append(postings)
+
+    assert(intersect(lists) == list(range(0, 30000, 30)))
+
+
+def testMatchesDictionaryIndex():
+    df = load_tweets(TWEETS)
+    index = build_index_tweets_1word(df)
+    inverted = InvertedIndex.build(df['text'])
+
+    #every word has the same rows (the dictionary index repeats a row per occurrence)
+    assert(set(index) == set(inverted.terms))
+    for word, rows in index.items():
+        assert(inverted.find(word) == sorted(set(rows)))
+
+    #multi-word queries match the set intersection in index_find_tweets_phrase_v2
+    for phrase in ['bad weather', 'landing gear failure', 'thank you for the help']:
+        expected = set(index[phrase.split()[0]])
+        for word in phrase.split()[1:]:
+            expected = expected.intersection(index[word])
+        assert(inverted.find_all(phrase.split()) == sorted(expected))
+
+    assert(inverted.find_all(['landing', 'zzzznotaword']) == [])
+
+
+def testVectorizedBuildMatches():
+    df = load_tweets(TWEETS)
+    index = build_index_tweets_1word(df)
+    vectorized = build_index_tweets_1word_vectorized(df)
+
+    #same words, in the same order, with the same rows (repeats included)
+    assert(list(vectorized) == list(index))
+    assert(vectorized == index)
+    assert(all(type(rows[0]) is int for rows in vectorized.values()))
+
+    #an empty tweet just has no words
+    empty = build_index_tweets_1word_vectorized(df.iloc[:3].assign(text=['', 'a b a', ' ']))
+    assert(empty == {'a': [1, 1], 'b': [1]})
+
+
+def testParallelBuildMatches():
+    df = load_tweets(TWEETS)
+    index = build_index_tweets_1word(df)
+
+    #more shards than workers, and shard borders that split words' row lists
+    assert(build_index_tweets_1word_parallel(df, workers=2, shards=7) == index)
+    assert(list(build_index_tweets_1word_parallel(df, workers=1)) == list(index))
+
+
+def testQueryCacheEvictsLeastRecentlyUsed():
+    cache = QueryCache(maxsize=2)
+    cache.put('a', [1])
+    cache.put('b', [2])
+    assert(cache.get('a') == [1])
+
+    #b is now the least recently used, so it goes first
+    cache.put('c', [3])
+    assert(cache.get('b') is None)
+    assert(cache.get('a') == [1] and cache.get('c') == [3])
+    assert(cache.hits == 3 and cache.misses == 1)
+
+
+def testCachedPhraseSearch():
+    df = load_tweets(TWEETS)
+    index = build_index_tweets_1word_vectorized(df)
+    expected = index_find_tweets_phrase_v2(df, index, 'bad weather')
+
+    hits = query_cache.hits
+    assert(cached_find_tweets_phrase(df, index, 'bad weather').equals(expected))
+    assert(cached_find_tweets_phrase(df, index, '  Bad   WEATHER ').equals(expected))
+    assert(query_cache.hits == hits + 1)
+
+    #another dataframe with an index built by hand gets its own answer, not the cached one
+    half = df.iloc[::2]
+    other = {}
+    for position, text in enumerate(half['text']):
+        for word in text.lower().split():
+            other.setdefault(word, []).append(position)
+    assert(cached_find_tweets_phrase(half, other, 'bad weather').equals(index_find_tweets_phrase_v2(half, other, 'bad weather')))
+    assert(query_cache.hits == hits + 1)
+
+    #rebuilding the index empties the cache
+    build_index_tweets_1word_vectorized(df)
+    assert(len(query_cache.results) == 0)
+
+
+def testStreamingBuild():
+    df = load_tweets(TWEETS)
+    index = InvertedIndex.build(df['text'])
+
+    #queries work on the rows read so far, while the file is still streaming in
+    seen = 0
+    for chunk, partial in build_index_streaming(TWEETS, chunksize=5000):
+        assert(len(chunk) <= 5000)
+        seen += len(chunk)
+        assert(partial.n_docs == seen)
+        assert(partial.find('flight') == [i for i in index.find('flight') if i < seen])
+
+    #once done it is the same index as building from the whole dataframe
+    assert(set(partial.terms) == set(index.terms))
+    for word in ['landing', 'the', 'weather']:
+        assert(partial.find(word) == index.find(word))
+
+
+def testPositionalPhrases():
+    index = PositionalIndex()
+    index.add(0, 'the landing gear failed')
+    index.add(1, 'gear landing the')
+    index.add(2, 'landing gear landing gear failure')
+    index.add(3, 'the the the')
+
+    #words in order and next to each other, even when repeated
+    assert(index.find_phrase('landing gear') == [0, 2])
+    assert(index.find_phrase('gear failure') == [2])
+    assert(index.find_phrase('landing gear failure') == [2])
+    assert(index.find_phrase('the the') == [3])
+    assert(index.find_phrase('gear the') == [])
+    assert(index.find_phrase('nothere') == [])
+
+    #it is still an InvertedIndex
+    assert(index.find_all(['the', 'landing']) == [0, 1])
+
+
+def testPositionalMatchesPhraseV2():
+    df = load_tweets(TWEETS)
+    index = build_index_tweets_1word(df)
+    positional = PositionalIndex.build(df['text'])
+
+    for phrase in ['bad weather', 'landing gear failure', 'thank you for the help']:
+        expected = sorted(index_find_tweets_phrase_v2(df, index, phrase).index)
+        assert(positional.find_phrase(phrase) == expected)
+
+
+def testSaveAndLoad():
+    workdir = tempfile.mkdtemp()
+    try:
+        df = load_tweets(TWEETS)
+        index = InvertedIndex.build(df['text'])
+        index.save(os.path.join(workdir, 'tweets.idx'))
+
+        loaded = InvertedIndex.load(os.path.join(workdir, 'tweets.idx'))
+        assert(loaded.n_docs == index.n_docs)
+        assert(set(loaded.terms) == set(index.terms))
+        for word in ['landing', 'flight', 'the', 'zzzznotaword']:
+            assert(loaded.find(word) == index.find(word))
+        assert(loaded.find_all(['bad', 'weather']) == index.find_all(['bad', 'weather']))
+
+        #positions survive the round trip too
+        positional = PositionalIndex.build(df['text'][:2000])
+        positional.save(os.path.join(workdir, 'positional.idx'))
+        loaded = PositionalIndex.load(os.path.join(workdir, 'positional.idx'))
+        assert(loaded.find_phrase('bad weather') == positional.find_phrase('bad weather'))
+
+        #and an index of one kind is not read as the other
+        try:
+            InvertedIndex.load(os.path.join(workdir, 'positional.idx'))
+            assert(False)
+        except ValueError:
+            pass
+    finally:
+        shutil.rmtree(workdir)
+
+
+def testStaleIndexIsRebuilt():
+    workdir = tempfile.mkdtemp()
+    try:
+        csv = os.path.join(workdir, 'tweets.csv')
+        index_file = os.path.join(workdir, 'tweets.idx')
+        shutil.copy(TWEETS, csv)
+
+        assert(InvertedIndex.load(index_file, source=csv) is None)
+        built = load_or_build_index(csv, index_file)
+        assert(InvertedIndex.load(index_file, source=csv) is not None)
+
+        #appending a tweet changes the size and mtime, so the saved index is stale
+        with open(csv, 'a') as f:
+            f.write('1,neutral,1.0,,,United,,me,,0,@united zzzznotaword,,,,\n')
+        assert(InvertedIndex.load(index_file, source=csv) is None)
+
+        rebuilt = load_or_build_index(csv, index_file)
+        assert(rebuilt.find('zzzznotaword') == [built.n_docs])
+    finally:
+        shutil.rmtree(workdir)
+
+
+def exhaustive_top_k(index, query, k):
+    '''scores every row that has any of the words, to check RankedIndex.top_k against
+    '''
+    average = index.total_length / index.n_docs
+    scores = {}
+    for word in dict.fromkeys(query.lower().split()):
+        postings = index.terms.get(word)
+        if postings is None:
+            continue
+        idf = index.idf(postings)
+        for row_id, tf in zip(postings, postings.tfs):
+            scores[row_id] = scores.get(row_id, 0.0) + index.bm25(idf, tf, index.lengths[row_id], average)
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+
+def testRankedTopK():
+    df = load_tweets(TWEETS)
+    index = RankedIndex.build(df['text'])
+
+    for query in ['bad weather', 'landing gear failure', 'the flight was late', 'thank you for the help', 'lax']:
+        for k in [1, 10, 100]:
+            expected = exhaustive_top_k(index, query, k)
+            found = index.top_k(query, k)
+
+            #words are added up in a different order, so equal scores can differ in
+            #the last bit and swap places; compare the scores and each row's score
+            everything = dict(exhaustive_top_k(index, query, index.n_docs))
+            assert(len(found) == len(expected))
+            assert(all(abs(a[1] - b[1]) < 1e-9 for a, b in zip(found, expected)))
+            assert(all(abs(everything[row_id] - score) < 1e-9 for row_id, score in found))
+
+    assert(index.top_k('zzzznotaword') == [])
+
+    best = ranked_find_tweets(df, index, 'landing gear failure', k=2)
+    assert(len(best) == 2 and best['score'].is_monotonic_decreasing)
+    assert(all('landing gear' in text.lower() for text in best['text']))
+
+    #the ranking survives a save and load
+    workdir = tempfile.mkdtemp()
+    try:
+        index.save(os.path.join(workdir, 'ranked.idx'))
+        loaded = RankedIndex.load(os.path.join(workdir, 'ranked.idx'))
+        assert(loaded.top_k('bad weather', 10) == index.top_k('bad weather', 10))
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    doTests()
@@ -0,0 +1,61 @@
+'''bench_join.py times spatial_join against calling find_naive (and the
+vectorised find_vectorized) once per park.
+
+    python bench_join.py --parks 5000 --landmarks 100000 --distance 0.5
+
+find_naive is only run for --naive-parks parks and scaled up; it makes one
+geopy call per (park, landmark) pair.
+'''
+import argparse, logging, sys, time
+import numpy as np
+
+from benchmark import random_points
+from distance import find_naive, find_vectorized
+from spatial_join import spatial_join
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def join_per_park(parks, landmarks, distance, find):
+    pairs = []
+    for i, me in enumerate(zip(parks['Y_COORD'], parks['X_COORD'])):
+        for j in find(me, landmarks, distance).index:
+            pairs.append((i, j))
+    return np.array(pairs, dtype=np.int64).reshape(-1, 2)
+
+
+if __name__ == '__main__':
+    #sets up logging, all logs go to the console
+    root = logging.getLogger()
+    root.setLevel(logging.WARNING)
+    root.addHandler(logging.StreamHandler(sys.stdout))
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--parks', type=int, default=5000)
+    parser.add_argument('--landmarks', type=int, default=100000)
+    parser.add_argument('--distance', type=float, default=0.5)
+    parser.add_argument('--naive-parks', type=int, default=2)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    parks = random_points(args.parks, seed=1).rename(columns={'LATITUDE': 'Y_COORD', 'LONGITUDE': 'X_COORD'})
+    landmarks = random_points(args.landmarks, seed=2)
+
+    sample = parks.iloc[:args.naive_parks]
+    naive_time, naive_pairs = timed(join_per_park, sample, landmarks, args.distance, find_naive)
+    logging.warning('find_naive per park       %10.1fs  (scaled up from %d parks)',
+                    naive_time * len(parks) / len(sample), len(sample))
+
+    vectorized_time, expected = timed(join_per_park, parks, landmarks, args.distance, find_vectorized)
+    logging.warning('find_vectorized per park  %10.3fs', vectorized_time)
+
+    for workers in args.workers:
+        join_time, pairs = timed(spatial_join, parks, landmarks, args.distance, workers=workers)
+        assert np.array_equal(pairs, expected)
+        assert np.array_equal(pairs[:len(naive_pairs)], naive_pairs)
+        logging.warning('spatial_join, %d worker(s) %10.3fs  (%d pairs, %d bytes)',
+                        workers, join_time, len(pairs), pairs.nbytes)
@@ -0,0 +1,59 @@
+'''bench_kdtree.py compares the KDTree in kdtree.py with the rtree index built
+in Geospatial Analysis II, for radius and nearest-neighbour queries.
+
+    python bench_kdtree.py --points 100000 --queries 1000
+
+The rtree is built like the notebook does, one insert per point. Its radius
+search looks up the bounding box of the circle and filters the candidates
+with distance.within, so both return exactly find_naive's rows. rtree's
+nearest() measures in degrees, not miles, so its answers can differ; only
+its speed is compared.
+'''
+import argparse, logging, sys, time
+import numpy as np
+
+from benchmark import random_points
+from kdtree import KDTree
+from rtree_index import insert_rtree, query_radius
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == '__main__':
+    #sets up logging, all logs go to the console
+    root = logging.getLogger()
+    root.setLevel(logging.WARNING)
+    root.addHandler(logging.StreamHandler(sys.stdout))
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--points', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--distance', type=float, default=0.5)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    points = random_points(args.points)
+    lats, lons = points['LATITUDE'].to_numpy(), points['LONGITUDE'].to_numpy()
+    queries = random_points(args.queries, seed=1)
+    origins = list(zip(queries['LATITUDE'], queries['LONGITUDE']))
+
+    rtree_build, idx = timed(insert_rtree, lats, lons)
+    kdtree_build, tree = timed(KDTree, lats, lons)
+    logging.warning('build       rtree %8.3fs   KDTree %8.3fs', rtree_build, kdtree_build)
+
+    rtree_time, expected = timed(lambda: [query_radius(idx, lats, lons, me, args.distance) for me in origins])
+    kdtree_time, found = timed(lambda: [tree.query_radius(me, args.distance) for me in origins])
+    batch_time, (batch_origins, batch_points) = timed(tree.query_radius_batch, queries['LATITUDE'], queries['LONGITUDE'], args.distance)
+
+    assert all(np.array_equal(a, b) for a, b in zip(expected, found))
+    assert np.array_equal(np.concatenate(found), batch_points)
+    logging.warning('radius      rtree %8.3fs   KDTree %8.3fs   KDTree batch %8.3fs   (%d queries, %d matches)',
+                    rtree_time, kdtree_time, batch_time, len(origins), len(batch_points))
+
+    rtree_time, _ = timed(lambda: [list(idx.nearest((me[1], me[0], me[1], me[0]), args.k)) for me in origins])
+    kdtree_time, _ = timed(tree.query_knn_batch, queries['LATITUDE'], queries['LONGITUDE'], args.k)
+    logging.warning('%d nearest  rtree %8.3fs   KDTree %8.3fs', args.k, rtree_time, kdtree_time)
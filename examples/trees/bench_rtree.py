@@ -0,0 +1,57 @@
+'''bench_rtree.py times the ways of getting a park facilities rtree ready to
+query: the notebook's insert loop, a bulk load, and reopening a saved index.
+
+    python bench_rtree.py --points 1000000
+
+Each row is the time until the first query returns, so reopening includes
+reading whatever pages that query touches from disk.
+'''
+import argparse, logging, shutil, sys, tempfile, time
+import numpy as np
+
+from benchmark import ME, random_points
+from rtree_index import insert_rtree, bulk_load_rtree, load_or_build_rtree, query_radius
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == '__main__':
+    #sets up logging, all logs go to the console
+    root = logging.getLogger()
+    root.setLevel(logging.WARNING)
+    root.addHandler(logging.StreamHandler(sys.stdout))
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--points', type=int, default=1000000)
+    parser.add_argument('--distance', type=float, default=0.5)
+    args = parser.parse_args()
+
+    parks = random_points(args.points).rename(columns={'LATITUDE': 'Y_COORD', 'LONGITUDE': 'X_COORD'})
+    lats, lons = parks['Y_COORD'].to_numpy(), parks['X_COORD'].to_numpy()
+    workdir = tempfile.mkdtemp()
+
+    def ready(build):
+        idx = build()
+        return idx, query_radius(idx, lats, lons, ME, args.distance)
+
+    try:
+        rows = [
+            ('insert loop, memory', lambda: insert_rtree(lats, lons)),
+            ('insert loop, disk', lambda: insert_rtree(lats, lons, workdir + '/insert')),
+            ('bulk load, memory', lambda: bulk_load_rtree(lats, lons)),
+            ('bulk load, disk', lambda: load_or_build_rtree(workdir + '/parks', parks)),
+            ('reopen from disk', lambda: load_or_build_rtree(workdir + '/parks', parks)),
+        ]
+        expected = None
+        for label, build in rows:
+            elapsed, (idx, found) = timed(ready, build)
+            expected = found if expected is None else expected
+            assert np.array_equal(found, expected)
+            idx.close()
+            logging.warning('%-20s %8.3fs', label, elapsed)
+    finally:
+        shutil.rmtree(workdir)
@@ -0,0 +1,71 @@
+'''benchmark.py times radius search over synthetic points spread over Chicago.
+
+    python benchmark.py --sizes 1000 100000 10000000
+
+find_naive is only run on up to --naive-limit points; for bigger sizes its
+time is scaled up from that sample. The landmark and park CSVs used in the
+notebooks are not in the repo, so the points are random, in the same box.
+'''
+import argparse, logging, sys, time
+import numpy as np
+import pandas as pd
+
+from distance import find_naive, find_vectorized
+from grid_index import GridIndex, find_grid
+
+#john crerar library
+ME = (41.790524, -87.6050427)
+
+#roughly the city limits
+CHICAGO = ((41.64, 42.02), (-87.94, -87.52))
+
+
+def random_points(n, seed=0):
+    '''a dataframe of n random LATITUDE/LONGITUDE points inside CHICAGO
+    '''
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'LATITUDE': rng.uniform(*CHICAGO[0], size=n),
+        'LONGITUDE': rng.uniform(*CHICAGO[1], size=n),
+    })
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+if __name__ == '__main__':
+    #sets up logging, all logs go to the console
+    root = logging.getLogger()
+    root.setLevel(logging.WARNING)
+    root.addHandler(logging.StreamHandler(sys.stdout))
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 10000000])
+    parser.add_argument('--distance', type=float, default=0.5)
+    parser.add_argument('--naive-limit', type=int, default=20000)
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        points = random_points(n)
+
+        sample = points.iloc[:args.naive_limit]
+        naive_time, expected = timed(find_naive, ME, sample, args.distance)
+        naive_time *= n / len(sample)
+
+        haversine_time, rough = timed(find_vectorized, ME, points, args.distance, refine=False)
+        refined_time, found = timed(find_vectorized, ME, points, args.distance)
+
+        #the refined search agrees with geopy on the sample it was checked against
+        assert list(found.index[found.index < len(sample)]) == list(expected.index)
+
+        build_time, grid = timed(GridIndex.from_frame, points, args.distance)
+        grid_time, gridded = timed(find_grid, ME, points, grid, args.distance)
+        assert gridded.equals(found)
+
+        logging.warning('%9d points  find_naive %9.3fs%s  haversine %.4fs  haversine+vincenty %.4fs  grid %.5fs (build %.3fs)  (%d found, %d differ without refinement)',
+                        n, naive_time, '*' if len(sample) < n else ' ', haversine_time, refined_time,
+                        grid_time, build_time, len(found), len(found.index.symmetric_difference(rough.index)))
+    logging.warning('* scaled up from %d points', args.naive_limit)
@@ -0,0 +1,144 @@
+'''distance.py is a vectorised version of find_naive from the Geospatial Analysis notebooks.
+
+find_naive calls geopy.distance.geodesic once per landmark in a python loop.
+Here all the distances are computed at once with numpy:
+
+ * haversine() treats the earth as a sphere. It is one array expression, but
+   it can be off by up to ~0.5% compared to geodesic, which uses the WGS-84
+   ellipsoid.
+ * vincenty() solves the same ellipsoid problem as geodesic (to well under a
+   millimetre), iterating on whole arrays instead of one point at a time.
+ * within() uses haversine for everything and vincenty only for the few
+   points whose haversine distance is too close to the radius to trust, so
+   it returns exactly the points find_naive would.
+'''
+import datetime, logging
+import numpy as np
+import geopy.distance
+
+EARTH_RADIUS_MILES = 3958.7613
+
+#WGS-84, the ellipsoid geopy uses by default
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+METERS_PER_MILE = 1609.344
+
+#how far haversine can be from the ellipsoid distance, as a fraction of it
+HAVERSINE_ERROR = 0.006
+
+
+def haversine(me, lats, lons):
+    '''great circle distance in miles from me = (lat, lon) to every (lats[i], lons[i]).
+    Like vincenty and within, me can also hold arrays, one origin per point.
+    '''
+    lat1, lon1 = np.radians(me[0]), np.radians(me[1])
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(a))
+
+
+def vincenty(me, lats, lons, iterations=200, tolerance=1e-12):
+    '''ellipsoid (WGS-84) distance in miles from me to every point, using Vincenty's
+    inverse formula on whole arrays. Points still not converged after iterations
+    (nearly antipodal ones) fall back to geopy.
+    '''
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    me = np.broadcast_to(me[0], lats.shape), np.broadcast_to(me[1], lons.shape)
+
+    U1 = np.arctan((1 - WGS84_F) * np.tan(np.radians(me[0])))
+    U2 = np.arctan((1 - WGS84_F) * np.tan(np.radians(lats)))
+    L = np.radians(lons - me[1])
+    sinU1, cosU1 = np.sin(U1), np.cos(U1)
+    sinU2, cosU2 = np.sin(U2), np.cos(U2)
+
+    lam = L.copy()
+    converged = np.zeros(lam.shape, dtype=bool)
+    for _ in range(iterations):
+        sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+        sin_sigma = np.sqrt((cosU2 * sin_lam) ** 2 + (cosU1 * sinU2 - sinU1 * cosU2 * cos_lam) ** 2)
+        cos_sigma = sinU1 * sinU2 + cosU1 * cosU2 * cos_lam
+        sigma = np.arctan2(sin_sigma, cos_sigma)
+
+        #coincident points have sin_sigma == 0; their distance is 0 whatever alpha is
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cosU1 * cosU2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            #points on the equator have cos2_alpha == 0
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sinU1 * sinU2 / cos2_alpha)
+
+        C = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+        previous = lam
+        lam = L + (1 - C) * WGS84_F * sin_alpha * (
+            sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+
+        converged = np.abs(lam - previous) < tolerance
+        if converged.all():
+            break
+
+    u2 = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+        - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+    miles = WGS84_B * A * (sigma - delta_sigma) / METERS_PER_MILE
+
+    for i in np.flatnonzero(~converged):
+        miles.flat[i] = geopy.distance.geodesic((me[0].flat[i], me[1].flat[i]), (lats.flat[i], lons.flat[i])).mi
+    return miles
+
+
+def within(me, lats, lons, distance, refine=True):
+    '''boolean mask of the points closer than distance miles to me. With refine,
+    points whose haversine distance is within HAVERSINE_ERROR of the radius are
+    re-measured with vincenty, so the answer matches geopy.distance.geodesic.
+    '''
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+
+    miles = haversine(me, lats, lons)
+    mask = miles < distance
+
+    if refine:
+        boundary = np.flatnonzero(np.abs(miles - distance) <= HAVERSINE_ERROR * distance)
+        if len(boundary):
+            me = np.broadcast_to(me[0], lats.shape)[boundary], np.broadcast_to(me[1], lons.shape)[boundary]
+            mask[boundary] = vincenty(me, lats[boundary], lons[boundary]) < distance
+
+    return mask
+
+
+def find_naive(me, landmarks, distance=0.5, lat='LATITUDE', lon='LONGITUDE'):
+    '''find_naive from the notebooks: one geopy call per landmark
+    '''
+    start = datetime.datetime.now()
+
+    rtn = []
+
+    N = len(landmarks)
+
+    for i in range(N):
+        coords_i = landmarks[lat].iloc[i], landmarks[lon].iloc[i]
+
+        if geopy.distance.geodesic(me, coords_i).mi < distance:
+            rtn.append(i)
+
+    logging.info('Elapsed Time find_naive() ' + str((datetime.datetime.now()-start).total_seconds()))
+
+    return landmarks.iloc[rtn]
+
+
+def find_vectorized(me, landmarks, distance=0.5, lat='LATITUDE', lon='LONGITUDE', refine=True):
+    '''same rows as find_naive, with all the distances computed in one go. Use
+    lat='Y_COORD', lon='X_COORD' for the park facilities.
+    '''
+    start = datetime.datetime.now()
+
+    rtn = np.flatnonzero(within(me, landmarks[lat].to_numpy(), landmarks[lon].to_numpy(), distance, refine))
+
+    logging.info('Elapsed Time find_vectorized() ' + str((datetime.datetime.now()-start).total_seconds()))
+
+    return landmarks.iloc[rtn]
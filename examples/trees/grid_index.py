@@ -0,0 +1,128 @@
+'''grid_index.py is an exact version of the binning in find_binned.
+
+find_binned cuts the city into 5 x 5 sectors with pd.cut and only searches the
+sector you are in, so it misses landmarks just across a sector border. Here:
+
+ * the cells are sized from the search radius, so a circle of that radius can
+   only reach the 3 x 3 cells around you (more for a bigger radius),
+ * all the cells the circle can touch are searched, and the candidates are
+   checked with distance.within, so the result is exactly find_naive's,
+ * the cell of a point is plain arithmetic, (lat - origin) // cell size.
+
+Points are sorted by cell number (row * columns + column), so the cells in one
+row of the grid are next to each other and each row is a single slice.
+'''
+import datetime, logging, math
+import numpy as np
+
+from distance import HAVERSINE_ERROR, within
+
+#a degree of latitude is at least this long anywhere on the WGS-84 ellipsoid
+MIN_MILES_PER_DEGREE = 68.7
+
+#the polar radius, the shortest distance from the centre of the earth
+MIN_EARTH_RADIUS_MILES = 3949.9
+
+
+def lat_span(distance):
+    '''degrees of latitude that distance miles can cover at most
+    '''
+    return distance * (1 + HAVERSINE_ERROR) / MIN_MILES_PER_DEGREE
+
+
+def lon_span(distance, lat):
+    '''degrees of longitude that distance miles can cover from any latitude up to lat.
+    Near the poles that can be all of them.
+    '''
+    angle = distance * (1 + HAVERSINE_ERROR) / MIN_EARTH_RADIUS_MILES
+    cos_lat = math.cos(math.radians(min(abs(lat), 90)))
+    if angle >= math.pi / 2 or math.sin(angle) >= cos_lat:
+        return 360.0
+    return math.degrees(math.asin(math.sin(angle) / cos_lat))
+
+
+class GridIndex:
+    '''A uniform grid over points, with cells about distance miles wide. Any
+    radius can be queried; distance only sets the cell size. Longitudes are
+    not wrapped around +-180 degrees.
+    '''
+
+    def __init__(self, lats, lons, distance=0.5):
+        self.lats = np.asarray(lats, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+
+        self.cell_lat = lat_span(distance)
+        if len(self.lats) == 0:
+            #no points, no cells: every query comes back empty
+            self.lat0 = self.lon0 = 0.0
+            self.cell_lon = lon_span(distance, 0)
+            self.rows = self.columns = 0
+            self.order = self.keys = np.empty(0, dtype=np.int64)
+            return
+
+        self.lat0 = self.lats.min()
+        self.lon0 = self.lons.min()
+        self.cell_lon = lon_span(distance, np.abs(self.lats).max())
+        self.rows = int((self.lats.max() - self.lat0) // self.cell_lat) + 1
+        self.columns = int((self.lons.max() - self.lon0) // self.cell_lon) + 1
+
+        keys = self.cell_row(self.lats) * self.columns + self.cell_column(self.lons)
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+
+    @classmethod
+    def from_frame(cls, landmarks, distance=0.5, lat='LATITUDE', lon='LONGITUDE'):
+        start = datetime.datetime.now()
+
+        index = cls(landmarks[lat].to_numpy(), landmarks[lon].to_numpy(), distance)
+
+        logging.info('Elapsed Time GridIndex.from_frame() ' + str((datetime.datetime.now()-start).total_seconds()))
+        return index
+
+    def cell_row(self, lat):
+        return np.floor((lat - self.lat0) / self.cell_lat).astype(np.int64)
+
+    def cell_column(self, lon):
+        return np.floor((lon - self.lon0) / self.cell_lon).astype(np.int64)
+
+    def candidates(self, me, distance):
+        '''positions of every point in a cell that a circle of distance miles around me overlaps
+        '''
+        dlat = lat_span(distance)
+        dlon = lon_span(distance, max(abs(me[0] - dlat), abs(me[0] + dlat)))
+
+        first_row = max(int(self.cell_row(me[0] - dlat)), 0)
+        last_row = min(int(self.cell_row(me[0] + dlat)), self.rows - 1)
+        if dlon >= 180:
+            first_column, last_column = 0, self.columns - 1
+        else:
+            first_column = max(int(self.cell_column(me[1] - dlon)), 0)
+            last_column = min(int(self.cell_column(me[1] + dlon)), self.columns - 1)
+        if first_row > last_row or first_column > last_column:
+            return np.empty(0, dtype=np.int64)
+
+        #each grid row's cells are one slice of the sorted points
+        rows = np.arange(first_row, last_row + 1) * self.columns
+        starts = np.searchsorted(self.keys, rows + first_column, side='left')
+        ends = np.searchsorted(self.keys, rows + last_column, side='right')
+        return np.concatenate([self.order[start:end] for start, end in zip(starts, ends)])
+
+    def query(self, me, distance):
+        '''positions of the points closer than distance miles to me, in increasing order
+        '''
+        found = self.candidates(me, distance)
+        found = found[within(me, self.lats[found], self.lons[found], distance)]
+        found.sort()
+        return found
+
+
+def find_grid(me, landmarks, index, distance=0.5):
+    '''find_binned, but exact: same rows as find_naive
+    '''
+    start = datetime.datetime.now()
+
+    rtn = index.query(me, distance)
+
+    logging.info('Elapsed Time find_grid() ' + str((datetime.datetime.now()-start).total_seconds()))
+
+    return landmarks.iloc[rtn]
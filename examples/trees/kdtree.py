@@ -0,0 +1,262 @@
+'''kdtree.py is a KD-tree for nearest-neighbour and radius queries over
+latitude/longitude points, in plain numpy.
+
+Points are placed on a unit sphere as (x, y, z). The straight line (chord)
+between two points there gets longer exactly when the great circle distance
+does, so an ordinary 3-d KD-tree over (x, y, z) answers questions about
+distances on the earth, and nothing goes wrong at +-180 degrees longitude.
+
+The tree is built in one go: split the points at the median of their widest
+coordinate, recurse, and stop at LEAF_SIZE points. Every node keeps its
+bounding box so a query can skip a whole subtree that is too far away.
+
+ * query_radius matches find_naive exactly: the tree finds candidates within a
+   slightly larger chord and distance.within makes the final call.
+ * query_radius_batch runs many origins at once, one tree level at a time,
+   with every (origin, node) pair of a level handled in the same numpy call.
+ * query_knn and query_knn_batch rank by great circle (haversine) distance.
+'''
+import datetime, heapq, logging, math
+import numpy as np
+
+from distance import EARTH_RADIUS_MILES, HAVERSINE_ERROR, within
+from grid_index import MIN_EARTH_RADIUS_MILES
+
+LEAF_SIZE = 32
+
+
+def to_xyz(lats, lons):
+    '''(n, 3) positions on the unit sphere
+    '''
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lon = np.radians(np.asarray(lons, dtype=float))
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def chord_for(distance):
+    '''the longest chord between two points less than distance miles apart
+    '''
+    angle = min(distance * (1 + HAVERSINE_ERROR) / MIN_EARTH_RADIUS_MILES, math.pi)
+    return 2 * math.sin(angle / 2)
+
+
+def chord_to_miles(chord):
+    return 2 * np.arcsin(np.minimum(chord / 2, 1.0)) * EARTH_RADIUS_MILES
+
+
+def box_distance2(xyz, lo, hi):
+    '''squared distance from each point to each box (0 inside it), row by row
+    '''
+    gap = np.maximum(np.maximum(lo - xyz, xyz - hi), 0)
+    return np.einsum('ij,ij->i', gap, gap)
+
+
+class KDTree:
+    '''A KD-tree over lat/lon points. order[start[n]:end[n]] are the points of
+    node n, left[n] and right[n] its children (-1 for leaves), lo[n] and hi[n]
+    its bounding box.
+    '''
+
+    def __init__(self, lats, lons, leaf_size=LEAF_SIZE):
+        self.lats = np.asarray(lats, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+        xyz = to_xyz(self.lats, self.lons)
+
+        order = np.arange(len(xyz))
+        start, end, left, right, lo, hi = [], [], [], [], [], []
+
+        def new_node(first, last):
+            box = xyz[order[first:last]]
+            start.append(first)
+            end.append(last)
+            left.append(-1)
+            right.append(-1)
+            lo.append(box.min(axis=0))
+            hi.append(box.max(axis=0))
+            return len(start) - 1
+
+        stack = [new_node(0, len(xyz))] if len(xyz) else []
+        while stack:
+            node = stack.pop()
+            first, last = start[node], end[node]
+            if last - first <= leaf_size:
+                continue
+
+            #split at the median of the widest coordinate
+            dim = int(np.argmax(hi[node] - lo[node]))
+            middle = (first + last) // 2
+            part = order[first:last]
+            order[first:last] = part[np.argpartition(xyz[part, dim], middle - first)]
+
+            left[node] = new_node(first, middle)
+            right[node] = new_node(middle, last)
+            stack.extend((left[node], right[node]))
+
+        self.order = order
+        self.xyz = xyz[order]
+        self.start = np.array(start, dtype=np.int64)
+        self.end = np.array(end, dtype=np.int64)
+        self.left = np.array(left, dtype=np.int64)
+        self.right = np.array(right, dtype=np.int64)
+        self.lo = np.array(lo).reshape(-1, 3)
+        self.hi = np.array(hi).reshape(-1, 3)
+
+    @classmethod
+    def from_frame(cls, landmarks, lat='LATITUDE', lon='LONGITUDE', leaf_size=LEAF_SIZE):
+        start = datetime.datetime.now()
+
+        tree = cls(landmarks[lat].to_numpy(), landmarks[lon].to_numpy(), leaf_size)
+
+        logging.info('Elapsed Time KDTree.from_frame() ' + str((datetime.datetime.now()-start).total_seconds()))
+        return tree
+
+    def __len__(self):
+        return len(self.order)
+
+    def candidate_pairs(self, xyz, chord):
+        '''(origin, slot) pairs where slot indexes self.xyz and the point is within
+        chord of origin xyz[origin]. The tree is walked one level at a time for
+        all origins together.
+        '''
+        chord2 = chord * chord
+        origins = np.arange(len(xyz)) if len(self) else np.empty(0, dtype=np.int64)
+        nodes = np.zeros(len(origins), dtype=np.int64)
+        leaf_origins, leaf_nodes = [], []
+
+        while len(origins):
+            near = box_distance2(xyz[origins], self.lo[nodes], self.hi[nodes]) <= chord2
+            origins, nodes = origins[near], nodes[near]
+
+            leaf = self.left[nodes] < 0
+            leaf_origins.append(origins[leaf])
+            leaf_nodes.append(nodes[leaf])
+
+            origins, nodes = origins[~leaf], nodes[~leaf]
+            origins = np.concatenate([origins, origins])
+            nodes = np.concatenate([self.left[nodes], self.right[nodes]])
+
+        if not leaf_origins:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        origins = np.concatenate(leaf_origins)
+        nodes = np.concatenate(leaf_nodes)
+
+        #every (origin, leaf) pair becomes one (origin, slot) pair per point of the leaf
+        sizes = self.end[nodes] - self.start[nodes]
+        origins = np.repeat(origins, sizes)
+        offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        slots = np.repeat(self.start[nodes], sizes) + offsets
+
+        diff = self.xyz[slots] - xyz[origins]
+        close = np.einsum('ij,ij->i', diff, diff) <= chord2
+        return origins[close], slots[close]
+
+    def query_radius_batch(self, lats, lons, distance):
+        '''every (origin, point) pair closer than distance miles, as two arrays sorted
+        by origin then point. Distances are geodesic, like find_naive's.
+        '''
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+
+        origins, slots = self.candidate_pairs(to_xyz(lats, lons), chord_for(distance))
+        points = self.order[slots]
+
+        keep = within((lats[origins], lons[origins]), self.lats[points], self.lons[points], distance)
+        origins, points = origins[keep], points[keep]
+
+        order = np.lexsort((points, origins))
+        return origins[order], points[order]
+
+    def query_radius(self, me, distance):
+        '''positions of the points closer than distance miles to me, in increasing order
+        '''
+        _, points = self.query_radius_batch([me[0]], [me[1]], distance)
+        return points
+
+    def query_knn(self, me, k=1):
+        '''the k points nearest to me by great circle distance: (positions, miles),
+        nearest first
+        '''
+        xyz = to_xyz(me[0], me[1])
+        k = min(k, len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        #best-first search: always open the closest box next, stop when the
+        #closest unopened box is further than the k-th best point so far
+        best = []
+        boxes = [(0.0, 0)] if len(self) else []
+        while boxes:
+            box2, node = heapq.heappop(boxes)
+            if len(best) == k and box2 > -best[0][0]:
+                break
+            if self.left[node] < 0:
+                slots = np.arange(self.start[node], self.end[node])
+                diff = self.xyz[slots] - xyz
+                for d2, slot in zip(np.einsum('ij,ij->i', diff, diff), slots):
+                    if len(best) < k:
+                        heapq.heappush(best, (-d2, -slot))
+                    elif (-d2, -slot) > best[0]:
+                        heapq.heapreplace(best, (-d2, -slot))
+            else:
+                children = np.array([self.left[node], self.right[node]])
+                for child, d2 in zip(children, box_distance2(np.stack([xyz, xyz]), self.lo[children], self.hi[children])):
+                    heapq.heappush(boxes, (d2, int(child)))
+
+        best.sort(reverse=True)
+        chords = np.sqrt([-d2 for d2, _ in best])
+        return self.order[[-slot for _, slot in best]], chord_to_miles(chords)
+
+    def query_knn_batch(self, lats, lons, k=1):
+        '''query_knn for many origins at once: (n, k) arrays of positions and miles.
+        Each round gathers every point within a chord of the origins still
+        unanswered; origins with at least k points in it are done (nothing
+        outside the chord can be closer), the rest retry with twice the chord.
+        '''
+        xyz = to_xyz(lats, lons)
+        k = min(k, len(self))
+        positions = np.zeros((len(xyz), k), dtype=np.int64)
+        chords = np.zeros((len(xyz), k))
+        if k == 0:
+            return positions, chord_to_miles(chords)
+
+        #first guess: a circle that would hold about k points if they were spread
+        #evenly over the bounding box of the tree
+        box = np.prod(np.maximum(self.hi[0] - self.lo[0], 1e-9)[np.argsort(self.hi[0] - self.lo[0])[1:]])
+        chord = math.sqrt(box * k / len(self) / math.pi)
+
+        remaining = np.arange(len(xyz))
+        while len(remaining):
+            origins, slots = self.candidate_pairs(xyz[remaining], min(chord, 2.0))
+            counts = np.bincount(origins, minlength=len(remaining))
+            done = (counts >= k) | (chord >= 2.0)
+
+            keep = done[origins]
+            origins, slots = origins[keep], slots[keep]
+            diff = self.xyz[slots] - xyz[remaining[origins]]
+            d2 = np.einsum('ij,ij->i', diff, diff)
+
+            #the k closest of each origin: sort by origin then distance, keep ranks 0..k-1
+            order = np.lexsort((d2, origins))
+            origins, slots, d2 = origins[order], slots[order], d2[order]
+            rank = np.arange(len(origins)) - np.searchsorted(origins, origins)
+            first = rank < k
+            rows = remaining[origins[first]]
+            positions[rows, rank[first]] = self.order[slots[first]]
+            chords[rows, rank[first]] = np.sqrt(d2[first])
+
+            remaining = remaining[~done]
+            chord *= 2
+
+        return positions, chord_to_miles(chords)
+
+
+def find_kdtree(me, landmarks, tree, distance=0.5):
+    '''same rows as find_naive, found with a KDTree over landmarks
+    '''
+    start = datetime.datetime.now()
+
+    rtn = tree.query_radius(me, distance)
+
+    logging.info('Elapsed Time find_kdtree() ' + str((datetime.datetime.now()-start).total_seconds()))
+
+    return landmarks.iloc[rtn]
@@ -0,0 +1,138 @@
+'''rtree_index.py builds the park facilities rtree from Geospatial Analysis II
+in one bulk load and keeps it on disk between runs.
+
+The notebook inserts one facility at a time into an in-memory rtree, so every
+kernel restart pays for the whole build again, and a tree grown by inserts
+ends up with overlapping, half-full nodes. Here:
+
+ * bulk_load_rtree hands all the points to libspatialindex at once, which
+   packs them bottom-up (Sort-Tile-Recursive) into full, tidy nodes,
+ * with a file name the index is written to <file>.dat/<file>.idx, and a
+   <file>.json next to them records the columns, a checksum of the
+   coordinates and the source file it was built from,
+ * load_or_build_rtree reopens those files when they still match, which
+   takes milliseconds, and rebuilds them otherwise.
+'''
+import datetime, hashlib, json, logging, os
+import numpy as np
+from rtree import index
+
+from distance import within
+from grid_index import lat_span, lon_span
+
+
+def source_stamp(file):
+    '''size and modification time of the file an index was built from
+    '''
+    stat = os.stat(file)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def points_stamp(lats, lons):
+    '''how many points and a checksum of their coordinates, so an index is never
+    reopened for points that moved
+    '''
+    checksum = hashlib.sha1()
+    for values in (lats, lons):
+        checksum.update(np.ascontiguousarray(values, dtype=float).tobytes())
+    return {'points': len(lats), 'sha1': checksum.hexdigest()}
+
+
+def remove_rtree(file):
+    for extension in ('dat', 'idx', 'json'):
+        if os.path.exists(file + '.' + extension):
+            os.remove(file + '.' + extension)
+
+
+def insert_rtree(lats, lons, file=None):
+    '''the notebook's build_index: one insert per point
+    '''
+    start = datetime.datetime.now()
+
+    if file is not None:
+        remove_rtree(file)
+    idx = index.Index(file) if file is not None else index.Index()
+    for i, (lat, lon) in enumerate(zip(lats, lons)):
+        idx.insert(i, (lon, lat, lon, lat))
+
+    logging.info('Elapsed Time insert_rtree() ' + str((datetime.datetime.now()-start).total_seconds()))
+    return idx
+
+
+def bulk_load_rtree(lats, lons, file=None):
+    '''builds the rtree from the coordinate arrays in one STR bulk load; the ids are
+    the row positions, like in the notebook
+    '''
+    start = datetime.datetime.now()
+
+    ids = np.arange(len(lats), dtype=np.int64)
+    points = np.column_stack([np.asarray(lons, dtype=float), np.asarray(lats, dtype=float)])
+    args = () if file is None else (file,)
+    if file is not None:
+        remove_rtree(file)
+
+    try:
+        idx = index.Index(*args, (ids, points, points))
+    except NotImplementedError:
+        #libspatialindex < 2.1 has no array loader, but loads streams the same way
+        stream = ((i, (x, y, x, y), None) for i, (x, y) in enumerate(points.tolist()))
+        idx = index.Index(*args, stream)
+
+    logging.info('Elapsed Time bulk_load_rtree() ' + str((datetime.datetime.now()-start).total_seconds()))
+    return idx
+
+
+def load_or_build_rtree(file, landmarks, lat='Y_COORD', lon='X_COORD', source=None):
+    '''opens the rtree saved at file, or bulk loads and saves a new one if there is
+    none, it was built from other columns or coordinates, or source changed since
+    '''
+    start = datetime.datetime.now()
+
+    lats, lons = landmarks[lat].to_numpy(), landmarks[lon].to_numpy()
+    stamp = {'columns': [lat, lon], **points_stamp(lats, lons),
+             'source': source_stamp(source) if source else None}
+    try:
+        with open(file + '.json') as f:
+            saved = json.load(f)
+    except FileNotFoundError:
+        saved = None
+
+    if saved == stamp and os.path.exists(file + '.idx'):
+        idx = index.Index(file)
+        logging.info('Elapsed Time load_or_build_rtree() reopened ' + str((datetime.datetime.now()-start).total_seconds()))
+        return idx
+
+    idx = bulk_load_rtree(lats, lons, file)
+    #closing flushes the pages to disk, then the index is reopened for queries
+    idx.close()
+    with open(file + '.json', 'w') as f:
+        json.dump(stamp, f)
+    idx = index.Index(file)
+
+    logging.info('Elapsed Time load_or_build_rtree() built ' + str((datetime.datetime.now()-start).total_seconds()))
+    return idx
+
+
+def query_radius(idx, lats, lons, me, distance):
+    '''positions of the points closer than distance miles to me, in increasing order:
+    the rtree finds the points in the circle's bounding box, distance.within
+    keeps the ones really inside it
+    '''
+    dlat = lat_span(distance)
+    dlon = lon_span(distance, abs(me[0]) + dlat)
+    found = np.fromiter(idx.intersection((me[1] - dlon, me[0] - dlat, me[1] + dlon, me[0] + dlat)), dtype=np.int64)
+    found = found[within(me, lats[found], lons[found], distance)]
+    found.sort()
+    return found
+
+
+def find_rtree(me, landmarks, idx, distance=0.5, lat='Y_COORD', lon='X_COORD'):
+    '''find_index from the notebook, with the distance in miles and exact results
+    '''
+    start = datetime.datetime.now()
+
+    rtn = query_radius(idx, landmarks[lat].to_numpy(), landmarks[lon].to_numpy(), me, distance)
+
+    logging.info('Elapsed Time find_rtree() ' + str((datetime.datetime.now()-start).total_seconds()))
+
+    return landmarks.iloc[rtn]
@@ -0,0 +1,76 @@
+'''spatial_join.py finds every (park, landmark) pair within some miles of each
+other in one pass, instead of calling find_naive once per park.
+
+One KDTree is built over one side (the bigger one, by default) and probed
+with the other side in chunks through KDTree.query_radius_batch, so each
+chunk is a handful of numpy calls rather than a loop over parks. Chunks keep
+the number of candidate pairs in memory bounded, and can be spread over a
+process pool. The answer is exact: the same pairs find_naive would give.
+'''
+import datetime, logging
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from kdtree import KDTree
+
+#the tree a worker process probes, set once per worker by start_worker
+worker_tree = None
+
+
+def start_worker(tree):
+    global worker_tree
+    worker_tree = tree
+
+
+def join_chunk(lats, lons, distance, offset, tree=None):
+    '''pairs (probe position, tree position) for one chunk of probe points
+    '''
+    tree = worker_tree if tree is None else tree
+    probes, points = tree.query_radius_batch(lats, lons, distance)
+    return np.column_stack([probes + offset, points])
+
+
+def spatial_join(left, right, distance=0.5, left_cols=('Y_COORD', 'X_COORD'), right_cols=('LATITUDE', 'LONGITUDE'),
+                 chunk_size=10000, workers=None, index_side=None):
+    '''every (left row, right row) pair closer than distance miles, as an (n, 2)
+    array of row positions sorted by left then right. The defaults are the
+    park facilities on the left and the landmarks on the right.
+
+    index_side picks the side the KDTree is built over ('left' or 'right');
+    by default the bigger one. workers > 1 probes the chunks in a process pool.
+    '''
+    start = datetime.datetime.now()
+
+    left_lats, left_lons = left[left_cols[0]].to_numpy(), left[left_cols[1]].to_numpy()
+    right_lats, right_lons = right[right_cols[0]].to_numpy(), right[right_cols[1]].to_numpy()
+
+    index_side = index_side or ('left' if len(left) > len(right) else 'right')
+    if index_side == 'left':
+        tree = KDTree(left_lats, left_lons)
+        probe_lats, probe_lons = right_lats, right_lons
+    else:
+        tree = KDTree(right_lats, right_lons)
+        probe_lats, probe_lons = left_lats, left_lons
+
+    chunks = [(probe_lats[i:i + chunk_size], probe_lons[i:i + chunk_size], distance, i)
+              for i in range(0, len(probe_lats), chunk_size)]
+
+    if workers and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=start_worker, initargs=(tree,)) as pool:
+            parts = list(pool.map(join_chunk, *zip(*chunks)))
+    else:
+        parts = [join_chunk(*chunk, tree=tree) for chunk in chunks]
+
+    pairs = np.concatenate(parts) if parts else np.empty((0, 2), dtype=np.int64)
+    if index_side == 'left':
+        pairs = pairs[:, ::-1]
+        pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+
+    #int32 halves the size of the result whenever the row positions allow it
+    if max(len(left), len(right)) < 2 ** 31:
+        pairs = pairs.astype(np.int32)
+
+    logging.info('Elapsed Time spatial_join() ' + str((datetime.datetime.now()-start).total_seconds()))
+    logging.info('spatial_join() found ' + str(len(pairs)) + ' pairs')
+
+    return np.ascontiguousarray(pairs)
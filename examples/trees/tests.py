@@ -0,0 +1,244 @@
+'''tests.py is a standalone script that checks the modules in this folder
+against geopy and the find_naive function from the notebooks.
+
+    python tests.py
+'''
+import sys, os, logging, shutil, tempfile, traceback
+import numpy as np
+import geopy.distance
+
+#sets up logging, all logs go to the console
+root = logging.getLogger()
+root.setLevel(logging.INFO)
+root.addHandler(logging.StreamHandler(sys.stdout))
+
+
+'''Now we will import our code
+'''
+from benchmark import ME, random_points
+from distance import HAVERSINE_ERROR, haversine, vincenty, within, find_naive, find_vectorized
+from grid_index import GridIndex, find_grid
+from kdtree import KDTree, find_kdtree
+from rtree_index import insert_rtree, bulk_load_rtree, load_or_build_rtree, query_radius, find_rtree
+from spatial_join import spatial_join
+
+
+def doTests():
+    tests = [
+        testVincentyMatchesGeopy,
+        testWithinMatchesGeodesic,
+        testFindVectorizedMatchesNaive,
+        testGridMatchesNaive,
+        testGridProbesOnlyNearbyCells,
+        testKDTreeRadiusMatchesNaive,
+        testKDTreeNearest,
+        testBulkLoadedRtree,
+        testSavedRtreeIsReopened,
+        testSpatialJoinMatchesPerParkSearch,
+    ]
+
+    for number, function in enumerate(tests, start=1):
+        logging.info('Test ' + str(number) + '. Running ' + function.__name__ + '()')
+
+        try:
+            function()
+            logging.info('Test ' + str(number) + '. Passed')
+
+        except AssertionError:
+            logging.info('Test ' + str(number) + '. Failed with error ' + str(traceback.format_exc()))
+
+
+def geodesic_miles(me, points):
+    return np.array([geopy.distance.geodesic(me, (lat, lon)).mi
+                     for lat, lon in zip(points['LATITUDE'], points['LONGITUDE'])])
+
+
+def testVincentyMatchesGeopy():
+    points = random_points(2000)
+    expected = geodesic_miles(ME, points)
+
+    #well under a millimetre everywhere in the city
+    assert(np.abs(vincenty(ME, points['LATITUDE'], points['LONGITUDE']) - expected).max() < 1e-6)
+
+    #haversine is close, but not exact
+    error = np.abs(haversine(ME, points['LATITUDE'], points['LONGITUDE']) - expected) / expected
+    assert(0 < error.max() < HAVERSINE_ERROR)
+
+    #edge cases: the same point, along the equator, and nearly the other side of the earth
+    assert(vincenty(ME, [ME[0]], [ME[1]])[0] == 0)
+    for there in [(0, 10), (0.5, 179.7), (-41.79, 92.39)]:
+        assert(abs(vincenty((0, 0), [there[0]], [there[1]])[0] - geopy.distance.geodesic((0, 0), there).mi) < 1e-6)
+
+
+def testWithinMatchesGeodesic():
+    points = random_points(5000, seed=1)
+    miles = geodesic_miles(ME, points)
+
+    for distance in [0.3, 0.5, 1, 2, 5, 10]:
+        assert((within(ME, points['LATITUDE'], points['LONGITUDE'], distance) == (miles < distance)).all())
+
+    #points just inside and just outside the radius, where haversine alone gets it wrong
+    boundary = np.sort(miles)[2500:2502].mean()
+    assert((within(ME, points['LATITUDE'], points['LONGITUDE'], boundary) == (miles < boundary)).all())
+
+
+def testFindVectorizedMatchesNaive():
+    points = random_points(3000, seed=2)
+    for distance in [0.5, 2, 8]:
+        assert(find_vectorized(ME, points, distance).equals(find_naive(ME, points, distance)))
+
+    #the park facilities keep their coordinates in X_COORD/Y_COORD
+    parks = points.rename(columns={'LATITUDE': 'Y_COORD', 'LONGITUDE': 'X_COORD'})
+    assert(find_vectorized(ME, parks, 2, lat='Y_COORD', lon='X_COORD').equals(
+        find_naive(ME, parks, 2, lat='Y_COORD', lon='X_COORD')))
+
+
+def testGridMatchesNaive():
+    points = random_points(3000, seed=3)
+    index = GridIndex.from_frame(points, distance=0.5)
+    miles_from = lambda me: geodesic_miles(me, points)
+
+    #queries inside the city, on its edge and outside it, with radii smaller
+    #and bigger than the cell size
+    for me in [ME, (41.64, -87.94), (42.05, -87.5), (41.9, -87.7)]:
+        miles = miles_from(me)
+        for distance in [0.1, 0.5, 0.8, 3, 50]:
+            expected = np.flatnonzero(miles < distance)
+            assert(list(index.query(me, distance)) == list(expected))
+
+    assert(find_grid(ME, points, index, 1).equals(find_naive(ME, points, 1)))
+
+
+def testGridProbesOnlyNearbyCells():
+    points = random_points(20000, seed=4)
+    index = GridIndex.from_frame(points, distance=0.5)
+
+    #a 0.5 mile circle sees the 3 x 3 cells around it, not the whole city
+    candidates = index.candidates(ME, 0.5)
+    assert(0 < len(candidates) < len(points) / 50)
+    assert(len(index.candidates((10.0, 10.0), 0.5)) == 0)
+
+    #like KDTree and spatial_join, an index over no points just finds nothing
+    empty = GridIndex.from_frame(points.iloc[:0], distance=0.5)
+    assert(len(empty.query(ME, 0.5)) == 0 and len(find_grid(ME, points.iloc[:0], empty)) == 0)
+
+
+def testKDTreeRadiusMatchesNaive():
+    points = random_points(3000, seed=5)
+    tree = KDTree.from_frame(points, leaf_size=8)
+
+    for me in [ME, (41.64, -87.94), (42.05, -87.5)]:
+        miles = geodesic_miles(me, points)
+        for distance in [0.1, 0.5, 3, 50]:
+            assert(list(tree.query_radius(me, distance)) == list(np.flatnonzero(miles < distance)))
+
+    assert(find_kdtree(ME, points, tree, 1).equals(find_naive(ME, points, 1)))
+
+    #a batch gives the same pairs as one query per origin
+    origins = random_points(50, seed=6)
+    batch_origins, batch_points = tree.query_radius_batch(origins['LATITUDE'], origins['LONGITUDE'], 2)
+    for i, me in enumerate(zip(origins['LATITUDE'], origins['LONGITUDE'])):
+        assert(list(batch_points[batch_origins == i]) == list(tree.query_radius(me, 2)))
+
+
+def testKDTreeNearest():
+    points = random_points(5000, seed=7)
+    tree = KDTree.from_frame(points)
+    origins = random_points(100, seed=8)
+
+    positions, miles = tree.query_knn_batch(origins['LATITUDE'], origins['LONGITUDE'], 7)
+    for i, me in enumerate(zip(origins['LATITUDE'], origins['LONGITUDE'])):
+        expected = haversine(me, points['LATITUDE'], points['LONGITUDE'])
+        nearest = np.argsort(expected)[:7]
+        assert(list(positions[i]) == list(nearest))
+        assert(np.allclose(miles[i], expected[nearest]))
+        assert(list(tree.query_knn(me, 7)[0]) == list(nearest))
+
+    #more neighbours than points, and an origin far from all of them
+    tiny = KDTree([41.8, 41.9], [-87.6, -87.7])
+    positions, miles = tiny.query_knn_batch([0.0], [0.0], 5)
+    assert(positions.shape == (1, 2) and list(positions[0]) == [0, 1])
+
+    #no neighbours asked for, or none to give
+    for small, k in [(tiny, 0), (KDTree([], []), 3)]:
+        positions, miles = small.query_knn(ME, k)
+        assert(len(positions) == 0 and len(miles) == 0)
+        positions, miles = small.query_knn_batch([ME[0]], [ME[1]], k)
+        assert(positions.shape == (1, 0) and miles.shape == (1, 0))
+
+
+def testBulkLoadedRtree():
+    parks = random_points(3000, seed=9).rename(columns={'LATITUDE': 'Y_COORD', 'LONGITUDE': 'X_COORD'})
+    lats, lons = parks['Y_COORD'].to_numpy(), parks['X_COORD'].to_numpy()
+
+    #bulk loading finds the same facilities as the notebook's insert loop, and as find_naive
+    inserted = insert_rtree(lats, lons)
+    bulk = bulk_load_rtree(lats, lons)
+    for distance in [0.2, 1, 5]:
+        assert(list(query_radius(bulk, lats, lons, ME, distance)) == list(query_radius(inserted, lats, lons, ME, distance)))
+    assert(find_rtree(ME, parks, bulk, 1).equals(find_naive(ME, parks, 1, lat='Y_COORD', lon='X_COORD')))
+
+
+def testSavedRtreeIsReopened():
+    workdir = tempfile.mkdtemp()
+    try:
+        parks = random_points(2000, seed=10).rename(columns={'LATITUDE': 'Y_COORD', 'LONGITUDE': 'X_COORD'})
+        source = os.path.join(workdir, 'CPD_Facilities.csv')
+        parks.to_csv(source, index=False)
+        file = os.path.join(workdir, 'parks')
+
+        built = load_or_build_rtree(file, parks, source=source)
+        expected = find_rtree(ME, parks, built, 2)
+        built.close()
+        modified = os.stat(file + '.idx').st_mtime_ns
+
+        #a second process just opens the files
+        reopened = load_or_build_rtree(file, parks, source=source)
+        assert(find_rtree(ME, parks, reopened, 2).equals(expected))
+        assert(os.stat(file + '.idx').st_mtime_ns == modified)
+        reopened.close()
+
+        #more facilities in the source file means a rebuild
+        more = random_points(2500, seed=10).rename(columns={'LATITUDE': 'Y_COORD', 'LONGITUDE': 'X_COORD'})
+        more.to_csv(source, index=False)
+        rebuilt = load_or_build_rtree(file, more, source=source)
+        assert(find_rtree(ME, more, rebuilt, 2).equals(find_naive(ME, more, 2, lat='Y_COORD', lon='X_COORD')))
+        rebuilt.close()
+
+        #without a source file, moved points (same count) still mean a rebuild
+        moved = more.assign(Y_COORD=more['Y_COORD'] + 0.01)
+        rebuilt = load_or_build_rtree(file, moved)
+        assert(find_rtree(ME, moved, rebuilt, 2).equals(find_naive(ME, moved, 2, lat='Y_COORD', lon='X_COORD')))
+        rebuilt.close()
+        modified = os.stat(file + '.idx').st_mtime_ns
+        reopened = load_or_build_rtree(file, moved)
+        assert(os.stat(file + '.idx').st_mtime_ns == modified)
+        reopened.close()
+    finally:
+        shutil.rmtree(workdir)
+
+
+def testSpatialJoinMatchesPerParkSearch():
+    parks = random_points(300, seed=11).rename(columns={'LATITUDE': 'Y_COORD', 'LONGITUDE': 'X_COORD'})
+    landmarks = random_points(2000, seed=12)
+
+    expected = []
+    for i, me in enumerate(zip(parks['Y_COORD'], parks['X_COORD'])):
+        expected.extend((i, j) for j in np.flatnonzero(within(me, landmarks['LATITUDE'], landmarks['LONGITUDE'], 1.5)))
+
+    #whichever side is indexed, however it is chunked, in or out of a process pool
+    for options in [{}, {'index_side': 'left'}, {'chunk_size': 7}, {'chunk_size': 50, 'workers': 2}]:
+        pairs = spatial_join(parks, landmarks, 1.5, **options)
+        assert(pairs.dtype == np.int32 and pairs.shape == (len(expected), 2))
+        assert([tuple(pair) for pair in pairs] == expected)
+
+    #and the pairs are find_naive's
+    naive = find_naive(tuple(parks.iloc[0][['Y_COORD', 'X_COORD']]), landmarks, 1.5)
+    pairs = spatial_join(parks, landmarks, 1.5)
+    assert(list(pairs[pairs[:, 0] == 0][:, 1]) == list(naive.index))
+
+    assert(len(spatial_join(parks.iloc[:0], landmarks, 1.5)) == 0)
+
+
+if __name__ == '__main__':
+    doTests()